@@ -14,7 +14,8 @@
 // #include <WiFiScan.h>
 // #include <WiFiServer.h>
 // #include <WiFiType.h>
-// #include <WiFiUdp.h>
+#include <WiFiUdp.h>
+#include <time.h>
 
 #include "DHT.h"
 
@@ -30,10 +31,77 @@ HardwareSerial Serial2(1);  // Create Serial2 instance (Using UART1)
 #define red2 37
 #define WIFI_SSID "ICHACK25"  // Use the network name (SSID) here
 #define WIFI_PASSWORD "p2P4v3ZnQK"  // Use the Wi-Fi password
+#define FIRE_THRESHOLD 27.5  // Temperature (°C) that counts as fire
+
+// Push mode: send readings to the Python ingestion server (sensors.SensorServer) over UDP
+// instead of waiting to be polled on /data. Alarms go out the moment they are read.
+#define PUSH_MODE true
+#define PUSH_HOST "172.30.175.1"  // Machine running the simulation
+#define PUSH_PORT 9750  // sensors.PUSH_PORT
+#define SENSOR_ID "esp32-0"  // Must match the id in the simulation's SENSORS table
+#define PUSH_INTERVAL 2000  // ms between routine readings while nothing changes
+#define LOOP_DELAY 100  // ms between sensor reads (the DHT library caches for 2 s)
+#define BINARY_READINGS true  // Push packed Reading structs (sensors.READING_DTYPE) instead of text
+#define NTP_SERVER "pool.ntp.org"  // Timestamps are 0 until the clock has synced
+
+// Binary reading, must match sensors.READING_DTYPE byte for byte (the ESP32 is little-endian)
+#define READING_MAGIC 0xF17E
+#define FLAG_ALARM 1
+#define FLAG_READ_ERROR 2
+struct __attribute__((packed)) Reading {
+  uint16_t magic;
+  uint16_t flags;
+  char sensor[8];  // NUL padded
+  double timestamp;  // Seconds since the epoch
+  float temperature;
+  float humidity;
+};
 
 
 DHT dht(DHTPIN, DHTTYPE);
 WebServer server(80);  // Create a web server on port 80
+WiFiUDP udp;
+
+unsigned long lastPush = 0;
+bool onFire = false;
+
+// Wall-clock seconds, or 0 while NTP hasn't set the clock yet
+double epochSeconds() {
+  struct timeval now;
+  gettimeofday(&now, NULL);
+  if (now.tv_sec < 1600000000) {
+    return 0;
+  }
+  return now.tv_sec + now.tv_usec / 1e6;
+}
+
+// Send one reading to the ingestion server, as a packed Reading or the /data text plus the sensor id
+void pushReading(float temperatureC, float humidity, uint16_t flags) {
+  udp.beginPacket(PUSH_HOST, PUSH_PORT);
+  if (BINARY_READINGS) {
+    Reading reading = {READING_MAGIC, flags, {0}, epochSeconds(), temperatureC, humidity};
+    strncpy(reading.sensor, SENSOR_ID, sizeof(reading.sensor));
+    udp.write((const uint8_t *)&reading, sizeof(reading));
+  }
+  else {
+    String data = "Sensor: " SENSOR_ID "\nTemperature: " + String(temperatureC) + "°C\nHumidity: " + String(humidity) + "%";
+    udp.print(data);
+  }
+  udp.endPacket();
+  lastPush = millis();
+}
+
+// Serve the latest reading on /data for the polling ingestion path
+void handleData() {
+  float humidity = dht.readHumidity();
+  float temperatureC = dht.readTemperature();
+  if (isnan(humidity) || isnan(temperatureC)) {
+    server.send(500, "text/plain", "Error reading data!");
+    return;
+  }
+  String data = "Temperature: " + String(temperatureC) + "°C\nHumidity: " + String(humidity) + "%";
+  server.send(200, "text/plain", data);
+}
 
 // void setup() {
 //   Serial.begin(9600); // Initialize the serial monitor
@@ -91,43 +159,39 @@ void setup() {
   }
   
 
+  configTime(0, 0, NTP_SERVER);  // UTC, syncs in the background
+
+  server.on("/data", HTTP_GET, handleData);  // Register once, not on every loop
   server.begin();  // Start the server
+  Serial.print("IP Address: ");
+  Serial.println(WiFi.localIP());
 }
 
 void loop() {
-  
-  Serial.println("Connected to Wi-Fi");
-  Serial.print("IP Address: ");
-  Serial.println(WiFi.localIP());
-  // Send data to LED screen
   float humidity = dht.readHumidity();
   float temperatureC = dht.readTemperature();
-  String message = "Temp: " + String(temperatureC) + "C, Hum: " + String(humidity) + "%\n";
-  Serial2.print(message);  // Transmit data over Serial2 (TX)
-
-  // Handle HTTP requests
-  server.on("/data", HTTP_GET, []() {
-    float humidity = dht.readHumidity();
-    float temperatureC = dht.readTemperature();
-    if (isnan(humidity) || isnan(temperatureC)) {
-      server.send(500, "text/plain", "Error reading data!");
-      return;
-    }
-    if (temperatureC > 27.5){
-      digitalWrite(red1, HIGH);
-      delay(5000);  // Delay between readings
 
+  if (!isnan(humidity) && !isnan(temperatureC)) {
+    bool hot = temperatureC > FIRE_THRESHOLD;
+    digitalWrite(red1, hot ? HIGH : LOW);
+
+    // Push straight away when the alarm state flips, otherwise on the routine interval
+    if (hot != onFire || millis() - lastPush >= PUSH_INTERVAL) {
+      if (PUSH_MODE) {
+        pushReading(temperatureC, humidity, hot ? FLAG_ALARM : 0);
+      }
+      else {
+        lastPush = millis();
+      }
+      // Send data to LED screen
+      String message = "Temp: " + String(temperatureC) + "C, Hum: " + String(humidity) + "%\n";
+      Serial2.print(message);  // Transmit data over Serial2 (TX)
     }
-    else{
-      
-      digitalWrite(red1, LOW);
-    }
-    String data = "Temperature: " + String(temperatureC) + "°C\nHumidity: " + String(humidity) + "%";
-    server.send(200, "text/plain", data);
-
-
-  });
-
+    onFire = hot;
+  }
+  else if (PUSH_MODE && BINARY_READINGS && millis() - lastPush >= PUSH_INTERVAL) {
+    pushReading(NAN, NAN, FLAG_READ_ERROR);  // Board is up but its sensor isn't answering
+  }
 
   server.handleClient();  // Handle incoming client requests
 
@@ -143,5 +207,5 @@ void loop() {
   //   Serial.println("%");
   // }
 
-  delay(2000);  // Delay between readings
+  delay(LOOP_DELAY);  // Short delay so alarms and requests are picked up quickly
 }
\ No newline at end of file
@@ -0,0 +1,249 @@
+"""Time every stage of the simulation tick on buildings from the demo grid up to a 100-floor tower.
+
+    python benchmark.py                                  # every preset, results in benchmark-<time>.json
+    python benchmark.py --sizes grid,final,5x20x20       # presets or floors x rows x cols grids
+    python benchmark.py --baseline main.json             # exit 1 if any stage got slower than in main.json
+    python benchmark.py --ensemble 500                   # time the Monte Carlo fire ETA instead of one sample
+"""
+import argparse
+import json
+import platform
+import resource
+import statistics
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from building import final_building, grid_building
+from fire import spread_fire_step
+from graph_core import BuildingGraph
+from routing import RouteTree, find_safest_paths, find_timed_paths
+from signage import MAX_SIGNS, LoopbackSignTransport, SignageOutput, sign_edges
+from simulation import FIRE_ENSEMBLE_SIZE, TICK_SPEED, Simulation
+
+SIZES = ("grid", "final", "10x10x10", "20x25x25", "100x50x50")  # Default presets, smallest first
+WARMUP = 1  # Untimed runs of each stage before the timed ones
+REPEAT = 5  # Timed runs of each stage
+MAX_SECONDS = 30.0  # Stop repeating a stage once its timed runs took this long, after at least one
+RENDER_MAX_NODES = 2000  # Larger buildings skip the render stages, the mini UI has a text per directed edge
+OCCUPANTS_PER_ROOM = 2
+FIRE_SPREADS = 3  # Spread steps taken before timing, so the fire has a front to work with
+TOLERANCE = 0.2  # A stage is a regression when its best run is this much slower than the baseline's
+NOISE_FLOOR = 1e-4  # Seconds, best runs closer than this to the baseline are never flagged
+
+
+# Function to build a preset or "FxRxC" building, returns (networkx graph, start room)
+def make_building(size):
+    if size == "grid":
+        return grid_building(), "R2_0_0"
+    if size == "final":
+        return final_building(), "R2_0_0"
+    floors, rows, cols = (int(part) for part in size.split("x"))
+    # Exit in the ground floor corner, fire halfway up in the far corner, the person on the top floor
+    fire = f"R{floors // 2}_{rows - 1}_{cols - 1}"
+    return grid_building(floors, rows, cols, fire_nodes=(fire,)), f"R{floors - 1}_0_0"
+
+# Function to time one stage with warmup and repeats, setup() runs untimed before each call
+def time_stage(run, setup=None, warmup=WARMUP, repeat=REPEAT, max_seconds=MAX_SECONDS, memory=True):
+    """Stats of the timed runs in seconds, plus the peak bytes one more run allocates (tracemalloc)."""
+    for _ in range(warmup):
+        run(*(setup() if setup else ()))
+    samples = []
+    while len(samples) < repeat and (not samples or sum(samples) < max_seconds):
+        args = setup() if setup else ()
+        start = time.perf_counter()
+        run(*args)
+        samples.append(time.perf_counter() - start)
+    result = {
+        "samples": samples,
+        "min": min(samples),
+        "median": statistics.median(samples),
+        "mean": statistics.fmean(samples),
+        "max": max(samples),
+        "stdev": statistics.stdev(samples) if len(samples) > 1 else 0.0,
+    }
+    if memory:
+        args = setup() if setup else ()
+        tracemalloc.start()
+        run(*args)
+        result["peak_bytes"] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return result
+
+# Function to set a building on fire and return its stages as name -> (run, setup)
+def tick_stages(G, core, simulation, render=True):
+    """Everything Simulation.step() and the render update() do, each on its own and repeatable."""
+    for _ in range(FIRE_SPREADS - 1):
+        simulation.spread_fire()
+    before_spread = core.fire
+    simulation.spread_fire()
+    simulation.calculate_fire_eta()
+    simulation.calculate_distance_to_safety()
+    simulation.route_tree.update(core.fire)
+    # Safe paths and edge states before and after the spread, alternated so every update and publish does real work
+    replans, frames = [simulation.safe_paths], [simulation.edge_states.state]
+    simulation.step()
+    replans.append(simulation.safe_paths)
+    frames.append(simulation.edge_states.state)
+    exits = core.names_of(np.flatnonzero(core.exit))
+    fires = core.names_of(np.flatnonzero(core.fire))
+
+    def next_replan():
+        replans.reverse()
+        return (replans[0],)
+
+    stages = {
+        "spread_fire": (lambda: spread_fire_step(core, core.fire), None),
+        "calculate_fire_eta": (simulation.calculate_fire_eta, None),
+        "calculate_distance_to_safety": (simulation.calculate_distance_to_safety, None),
+        "find_safest_paths": (lambda: find_safest_paths(G, exits, fires), None),
+        # The per-tick repair of the live route tree after one spread step
+        "route_tree_update": (lambda tree: tree.update(core.fire), lambda: (RouteTree(core, before_spread),)),
+        "find_timed_paths": (lambda: find_timed_paths(core, core.fire, core.fire_eta, simulation.tick_speed,
+                                                      simulation.route_tree), None),
+        "update_edge_states": (simulation.update_edge_states, next_replan),
+        "crowd_step": (lambda: simulation.crowd.step(simulation.next_hop, simulation.hop_edge), None),
+        "snapshot": (simulation.snapshot, None),
+    }
+    stages.update(signage_stages(core, frames))
+    if render:
+        stages.update(render_stages(core, simulation))
+    return stages
+
+# Function to return the stage that publishes two ticks' edge states to the door signs in turn
+def signage_stages(core, frames):
+    """Through the loopback transport, so the timing includes decoding what a controller would."""
+    frames = list(frames)
+    # Big buildings have more directed edges than one controller takes, keep the ones that change
+    edges = sign_edges(core)
+    edges = edges[np.argsort(frames[0][edges] == frames[1][edges], kind="stable")][:MAX_SIGNS]
+    signs = SignageOutput(edges, LoopbackSignTransport())
+
+    def next_frame():
+        frames.reverse()
+        return (frames[0],)
+    return {"signage_publish": (signs.publish, next_frame)}
+
+# Function to build the 3D view off-screen and return the render update() and canvas draw stages
+def render_stages(core, simulation):
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    from render import BuildingView, node_colors
+
+    fig = plt.figure(figsize=(15, 7))
+    gs = fig.add_gridspec(1, 2, width_ratios=[2, 1])
+    ax_3d = fig.add_subplot(gs[0], projection="3d")
+    ax_ui = fig.add_subplot(gs[1])
+    first = simulation.snapshot()
+    view = BuildingView(ax_3d, ax_ui, core, first.person_position)
+    simulation.spread_fire()
+    simulation.step()
+    # Alternate between two ticks so the signs really change every frame
+    frames = [first, simulation.snapshot()]
+
+    def next_frame():
+        frames.reverse()
+        return (frames[0],)
+
+    def update(snapshot):
+        view.draw(node_colors(snapshot), snapshot.edge_states, snapshot.person_position, snapshot.tick)
+    return {
+        "render_update": (update, next_frame),
+        "render_draw": (fig.canvas.draw, None),
+    }
+
+# Function to benchmark every stage on one building
+def run_size(size, args):
+    start = time.perf_counter()
+    G, start_room = make_building(size)
+    core = BuildingGraph.from_networkx(G)
+    rng = np.random.default_rng(0)
+    occupants = rng.integers(0, len(core), args.occupants_per_room * len(core))
+    simulation = Simulation(G, core, core.index[start_room], args.tick_speed, args.ensemble, occupants=occupants)
+    build_seconds = time.perf_counter() - start
+
+    render = len(core) <= args.render_max_nodes
+    stages = tick_stages(G, core, simulation, render)
+    result = {
+        "size": size,
+        "nodes": len(core),
+        "edges": len(core.indices),
+        "occupants": len(simulation.crowd),
+        "build_seconds": build_seconds,
+        "stages": {},
+        "skipped": [] if render else ["render_update", "render_draw"],
+    }
+    for name, (run, setup) in stages.items():
+        stats = time_stage(run, setup, args.warmup, args.repeat, args.max_seconds, not args.no_memory)
+        result["stages"][name] = stats
+        print(f"{size:>10} {name:<29} median {stats['median'] * 1000:10.3f} ms  "
+              f"min {stats['min'] * 1000:10.3f} ms  n={len(stats['samples'])}"
+              + (f"  peak {stats['peak_bytes'] / 2**20:9.2f} MiB" if "peak_bytes" in stats else ""),
+              file=sys.stderr)
+    result["max_rss_mib"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # Process peak so far
+    return result
+
+# Function to list stages whose best run got slower than the baseline's
+def regressions(results, baseline, tolerance=TOLERANCE):
+    """(size, stage, baseline min, min) for every stage over tolerance slower, by preset name.
+
+    Compares the fastest run rather than the median, the least disturbed by
+    whatever else the machine was doing.
+    """
+    old = {(size["size"], name): stats["min"]
+           for size in baseline["sizes"] for name, stats in size["stages"].items()}
+    slower = []
+    for size in results["sizes"]:
+        for name, stats in size["stages"].items():
+            before = old.get((size["size"], name))
+            if before is not None and stats["min"] > before * (1 + tolerance) and stats["min"] - before > NOISE_FLOOR:
+                slower.append((size["size"], name, before, stats["min"]))
+    return slower
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default=",".join(SIZES), help="comma-separated presets (grid, final) or FxRxC grids")
+    parser.add_argument("--out", default=time.strftime("benchmark-%Y%m%d-%H%M%S.json"), help="JSON results file")
+    parser.add_argument("--warmup", type=int, default=WARMUP, help="untimed runs per stage")
+    parser.add_argument("--repeat", type=int, default=REPEAT, help="timed runs per stage")
+    parser.add_argument("--max-seconds", type=float, default=MAX_SECONDS, help="stop repeating a stage after this long")
+    parser.add_argument("--tick-speed", type=int, default=TICK_SPEED, help="milliseconds of simulated time per tick")
+    parser.add_argument("--ensemble", type=int, default=FIRE_ENSEMBLE_SIZE,
+                        help="fire futures per ETA update, 0 for one sample")
+    parser.add_argument("--occupants-per-room", type=int, default=OCCUPANTS_PER_ROOM)
+    parser.add_argument("--render-max-nodes", type=int, default=RENDER_MAX_NODES,
+                        help="skip the render stages on larger buildings")
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc run of each stage")
+    parser.add_argument("--baseline", help="earlier results to compare against")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE, help="allowed slowdown before failing, 0.2 = 20%%")
+    args = parser.parse_args(argv)
+
+    results = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.platform(),
+        "settings": {key: value for key, value in vars(args).items() if key not in ("out", "baseline")},
+        "sizes": [],
+    }
+    for size in args.sizes.split(","):
+        results["sizes"].append(run_size(size, args))
+        # Written after every building, so a long run that gets killed still leaves its results
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=1)
+    print(f"results in {args.out}", file=sys.stderr)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            slower = regressions(results, json.load(f), args.tolerance)
+        for size, name, before, after in slower:
+            print(f"REGRESSION {size} {name}: {before * 1000:.3f} ms -> {after * 1000:.3f} ms", file=sys.stderr)
+        if slower:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
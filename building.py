@@ -0,0 +1,77 @@
+import networkx as nx
+
+# Building configuration
+FLOORS = 3
+ROWS = 3
+COLS = 4
+
+# Sensor id -> (/data endpoint to poll or None if the board pushes, rooms it watches, fire threshold in °C)
+SENSORS = {
+    "esp32-0": (None, ["R2_2_0"], 27.5),  # Polled at http://172.30.175.227/data when PUSH_MODE is off
+}
+
+
+# Function to build a grid building with one stairwell column linking the floors
+def grid_building(floors=FLOORS, rows=ROWS, cols=COLS, exit_nodes=("R0_0_0",), fire_nodes=("R2_2_0",)):
+    G = nx.Graph()  # Use an undirected graph for bidirectional edges
+
+    # Generate nodes
+    nodes = [f"R{floor}_{row}_{col}" for floor in range(floors) for row in range(rows) for col in range(cols)]
+    stairwell_row, stairwell_col = rows // 2, cols // 2
+    stairwell_nodes = {f"R{floor}_{stairwell_row}_{stairwell_col}" for floor in range(floors)}
+    exit_nodes = set(exit_nodes)
+    fire_nodes = set(fire_nodes)
+
+    # Add nodes to graph
+    for node in nodes:
+        G.add_node(node, exit=node in exit_nodes, fire=node in fire_nodes, stairwell=node in stairwell_nodes, warning=float('inf'), fire_eta=float('inf'), distance_to_safety=float('inf'))
+
+    # Connect rooms within the same floor (bidirectional)
+    for floor in range(floors):
+        for row in range(rows):
+            for col in range(cols):
+                current = f"R{floor}_{row}_{col}"
+                if col < cols - 1: G.add_edge(current, f"R{floor}_{row}_{col + 1}", weight=4)
+                if row < rows - 1: G.add_edge(current, f"R{floor}_{row + 1}_{col}", weight=4)
+
+    # Connect floors via stairwell (bidirectional)
+    for floor in range(floors - 1):
+        lower, upper = f"R{floor}_{stairwell_row}_{stairwell_col}", f"R{floor + 1}_{stairwell_row}_{stairwell_col}"
+        G.add_edge(lower, upper, weight=4)
+    return G
+
+# Function to build the hand-made five-floor layout from final.py
+def final_building(floors=5, exit_nodes=("R0_0_0", "R0_0_1"), fire_nodes=("R4_2_0",)):
+    G = nx.Graph()  # Use an undirected graph for bidirectional edges
+
+    # Ground floor is a lobby with the two exits, every floor above has two corridors joined in the middle
+    nodes = ["R0_0_0", "R0_0_1", "R0_1_0"]
+    for floor in range(1, floors):
+        nodes.extend([f"R{floor}_0_{col}" for col in range(5)] + [f"R{floor}_1_2"] +
+                     [f"R{floor}_2_{col}" for col in range(5)])
+    stairwell_nodes = {"R0_1_0"} | {f"R{floor}_{row}_3" for floor in range(1, floors - 1) for row in (0, 2)}
+    exit_nodes = set(exit_nodes)
+    fire_nodes = set(fire_nodes)
+
+    # Add nodes to graph
+    for node in nodes:
+        G.add_node(node, exit=node in exit_nodes, fire=node in fire_nodes, stairwell=node in stairwell_nodes, warning=float('inf'), fire_eta=float('inf'), distance_to_safety=float('inf'))
+
+    G.add_edge("R0_0_0", "R0_0_1", weight=4)
+    G.add_edge("R0_0_0", "R0_1_0", weight=4)
+    G.add_edge("R0_1_0", "R1_0_0", weight=4)
+    G.add_edge("R0_0_1", "R1_0_4", weight=4)
+
+    # Connect rooms within the same floor (bidirectional)
+    for floor in range(1, floors):
+        for row in (0, 2):
+            for col in range(4):
+                G.add_edge(f"R{floor}_{row}_{col}", f"R{floor}_{row}_{col + 1}", weight=4)
+        G.add_edge(f"R{floor}_0_2", f"R{floor}_1_2", weight=4)
+        G.add_edge(f"R{floor}_1_2", f"R{floor}_2_2", weight=4)
+
+    # Connect floors via stairwell (bidirectional)
+    for floor in range(1, floors - 1):
+        for row in (0, 2):
+            G.add_edge(f"R{floor}_{row}_3", f"R{floor + 1}_{row}_3", weight=4)
+    return G
@@ -0,0 +1,305 @@
+"""Emulate a farm of ESP32/DHT11 boards on localhost for load-testing sensor ingestion.
+
+    python emulator.py --sensors 200                          # /emu-N/data on port 9800 until Ctrl-C
+    python emulator.py --sensors 200 --per-port --latency 0.05 --error-rate 0.02 --measure 30
+    python emulator.py --sensors 500 --push 127.0.0.1:9750 --fire emu-3:10:60 --measure 30
+"""
+import argparse
+import asyncio
+import random
+import socket
+import threading
+import time
+
+import numpy as np
+from aiohttp import web
+
+from sensors import (FIRE_THRESHOLD, FLAG_ALARM, FLAG_READ_ERROR, POLL_INTERVAL, READING_DTYPE,
+                     READING_MAGIC, SensorPoller, SensorServer, _BackgroundLoop)
+
+EMULATOR_PORT = 9800  # First port of the farm
+AMBIENT = 22.0  # °C of a room with no fire
+FIRE_RATE = 30.0  # °C per minute a scheduled fire heats its room by
+FIRE_PEAK = 90.0  # °C a scheduled fire levels off at
+
+
+# Function to build a scriptable temperature curve
+def temperature_curve(ambient=AMBIENT, noise=0.3, fires=(), seed=None):
+    """Curve t -> °C for t seconds after the farm started.
+
+    Ambient plus gaussian noise, rounded to whole degrees like a DHT11.
+    fires is a list of (start seconds, °C per minute, peak °C); each one
+    heats the room from its start time until it reaches its peak.
+    """
+    rng = random.Random(seed)
+
+    def curve(t):
+        temperature = ambient + rng.gauss(0, noise)
+        for start, rate, peak in fires:
+            if t > start:
+                temperature = max(temperature, min(peak, ambient + (t - start) * rate / 60))
+        return float(round(temperature))
+    return curve
+
+
+class VirtualSensor:
+    """One emulated board: its temperature curve and how badly it behaves.
+
+    latency is the mean extra delay before answering, drawn from an
+    exponential distribution so there is a tail. error_rate is the share of
+    reads that fail like a DHT11 does (500 "Error reading data!"), and
+    outages are (start, end) seconds during which the board is unreachable.
+    """
+
+    def __init__(self, sensor_id, curve=None, humidity=40.0, latency=0.0, error_rate=0.0, outages=(), seed=None):
+        self.sensor_id = sensor_id
+        self.curve = curve or temperature_curve(seed=seed)
+        self.humidity = humidity
+        self.latency = latency
+        self.error_rate = error_rate
+        self.outages = list(outages)
+        self.rng = random.Random(seed)
+        self.served = 0  # Good /data answers and pushes
+        self.errors = 0  # Failed reads reported
+
+    def is_down(self, t):
+        return any(start <= t < end for start, end in self.outages)
+
+    def delay(self):
+        return self.rng.expovariate(1 / self.latency) if self.latency else 0.0
+
+    def reading(self, t):
+        """(temperature, humidity) at t, or None if this read fails."""
+        if self.rng.random() < self.error_rate:
+            self.errors += 1
+            return None
+        self.served += 1
+        return self.curve(t), self.humidity
+
+
+# Function to format a reading exactly like handleData() in DHT11_code.ino
+def data_text(temperature, humidity):
+    return f"Temperature: {temperature:.2f}°C\nHumidity: {humidity:.2f}%"
+
+
+class EmulatorFarm(_BackgroundLoop):
+    """Serves many VirtualSensors from one background asyncio loop.
+
+    By default every board answers GET /<sensor id>/data on one port; with
+    per_port each gets its own port from port upwards (0 picks free ports)
+    and answers GET /data like the real board. With push_to=(host, port)
+    every board also pushes a reading every push_interval seconds, packed
+    binary or text like DHT11_code.ino. start() returns once everything is
+    bound; endpoints then maps sensor id -> /data URL for SensorPoller.
+    """
+
+    def __init__(self, sensors, host="127.0.0.1", port=EMULATOR_PORT, per_port=False,
+                 push_to=None, push_interval=POLL_INTERVAL, binary=True):
+        self.sensors = {sensor.sensor_id: sensor for sensor in sensors}
+        self.host = host
+        self.port = port
+        self.per_port = per_port
+        self.push_to = push_to
+        self.push_interval = push_interval
+        self.binary = binary
+        self.endpoints = {}
+        self.started = None
+        self._ready = threading.Event()
+        self._error = None
+
+    def start(self):
+        super().start()
+        self._ready.wait()
+        if self._error is not None:
+            self._thread.join()
+            raise OSError(f"Could not start emulator farm: {self._error!r}")
+
+    def now(self):
+        return time.monotonic() - self.started
+
+    async def _handle(self, request, sensor):
+        t = self.now()
+        if sensor.is_down(t):
+            request.transport.close()  # Unreachable board, the client sees the connection drop
+            return web.Response(status=503)
+        await asyncio.sleep(sensor.delay())
+        reading = sensor.reading(t)
+        if reading is None:
+            return web.Response(status=500, text="Error reading data!")
+        return web.Response(text=data_text(*reading))
+
+    def _app(self, routes):
+        app = web.Application()
+        for path, sensor in routes:
+            app.router.add_get(path, lambda request, sensor=sensor: self._handle(request, sensor))
+        return app
+
+    def _bind(self, port):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((self.host, port))
+        return sock
+
+    async def _serve(self, app, sock):
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        await web.SockSite(runner, sock).start()
+        return runner
+
+    async def _push(self, transport, sensor):
+        await asyncio.sleep(random.uniform(0, self.push_interval))
+        while True:
+            t = self.now()
+            if not sensor.is_down(t):
+                await asyncio.sleep(sensor.delay())
+                reading = sensor.reading(t)
+                transport.sendto(self._message(sensor, reading))
+            await asyncio.sleep(self.push_interval)
+
+    def _message(self, sensor, reading):
+        if not self.binary:
+            if reading is None:
+                return b"Error reading data!"
+            return f"Sensor: {sensor.sensor_id}\n{data_text(*reading)}".encode()
+        record = np.zeros(1, dtype=READING_DTYPE)
+        record["magic"] = READING_MAGIC
+        record["sensor"] = sensor.sensor_id.encode()
+        record["timestamp"] = time.time()
+        if reading is None:
+            record["flags"] = FLAG_READ_ERROR
+            record["temperature"] = record["humidity"] = np.nan
+        else:
+            record["temperature"], record["humidity"] = reading
+            record["flags"] = FLAG_ALARM if reading[0] > FIRE_THRESHOLD else 0
+        return record.tobytes()
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        runners, tasks, transport = [], [], None
+        try:
+            if self.per_port:
+                for i, sensor in enumerate(self.sensors.values()):
+                    sock = self._bind(self.port + i if self.port else 0)
+                    runners.append(await self._serve(self._app([("/data", sensor)]), sock))
+                    self.endpoints[sensor.sensor_id] = f"http://{self.host}:{sock.getsockname()[1]}/data"
+            else:
+                sock = self._bind(self.port)
+                routes = [(f"/{sensor_id}/data", sensor) for sensor_id, sensor in self.sensors.items()]
+                runners.append(await self._serve(self._app(routes), sock))
+                for path, sensor in routes:
+                    self.endpoints[sensor.sensor_id] = f"http://{self.host}:{sock.getsockname()[1]}{path}"
+            if self.push_to is not None:
+                transport, _ = await loop.create_datagram_endpoint(asyncio.DatagramProtocol, remote_addr=self.push_to)
+        except OSError as e:
+            self._error = e
+        self.started = time.monotonic()
+        self._ready.set()
+        try:
+            if self._error is None:
+                if transport is not None:
+                    tasks = [asyncio.create_task(self._push(transport, sensor)) for sensor in self.sensors.values()]
+                await self._stopped.wait()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            if transport is not None:
+                transport.close()
+            for runner in runners:
+                await runner.cleanup()
+
+
+# Function to measure how the real ingestion path copes with the farm
+def measure(farm, seconds, push_port=None):
+    """Run a SensorPoller (or a SensorServer for pushes) against the farm and print what arrived."""
+    arrivals = {sensor_id: [] for sensor_id in farm.sensors}
+    latencies = []
+
+    def on_reading(reading):
+        arrivals.setdefault(reading.sensor_id, []).append(time.monotonic())
+
+    def on_records(records, received_at):
+        for sensor_id in records["sensor"]:
+            arrivals.setdefault(sensor_id.decode(), []).append(time.monotonic())
+        latencies.extend(received_at - records["timestamp"])
+
+    if push_port is None:
+        ingest = SensorPoller(farm.endpoints, on_reading)
+    else:
+        ingest = SensorServer(on_reading, host=farm.host, udp_port=push_port, on_records=on_records)
+    ingest.start()
+    time.sleep(seconds)
+    ingest.stop()
+
+    total = sum(len(times) for times in arrivals.values())
+    gaps = np.concatenate([np.diff(times) for times in arrivals.values() if len(times) > 1] or [np.zeros(0)])
+    print(f"{total} readings from {sum(1 for times in arrivals.values() if times)} of {len(farm.sensors)} sensors "
+          f"in {seconds:.0f} s, {total / seconds:.1f} readings/s")
+    print(f"served {sum(s.served for s in farm.sensors.values())}, "
+          f"failed reads {sum(s.errors for s in farm.sensors.values())}")
+    if len(gaps):
+        p50, p99 = np.percentile(gaps, [50, 99])
+        print(f"gap between readings of one sensor: p50 {p50:.2f} s, p99 {p99:.2f} s, max {gaps.max():.2f} s")
+    if latencies:
+        p50, p99 = np.percentile(latencies, [50, 99]) * 1000
+        print(f"push latency: p50 {p50:.2f} ms, p99 {p99:.2f} ms")
+    if push_port is None:
+        print(f"sensors still failing: {sum(1 for failures in ingest.failures.values() if failures)}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sensors", type=int, default=100, help="number of virtual boards, named emu-0, emu-1, ...")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=EMULATOR_PORT, help="port (or first port with --per-port), 0 for any")
+    parser.add_argument("--per-port", action="store_true", help="one port per board instead of one path per board")
+    parser.add_argument("--latency", type=float, default=0.0, help="mean seconds each board takes to answer")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of reads that fail with a 500")
+    parser.add_argument("--outage", action="append", default=[], metavar="ID:START:END",
+                        help="board unreachable from START to END seconds")
+    parser.add_argument("--fire", action="append", default=[], metavar="ID:START[:RATE]",
+                        help=f"board's room heats at RATE °C/min (default {FIRE_RATE:g}) from START seconds")
+    parser.add_argument("--push", metavar="HOST:PORT", help="also push readings here like the firmware does")
+    parser.add_argument("--text", action="store_true", help="push the text format instead of binary")
+    parser.add_argument("--seed", type=int, help="make curves, latencies and errors repeatable")
+    parser.add_argument("--measure", type=float, metavar="SECONDS",
+                        help="run the real poller (or push server) against the farm for this long and report")
+    args = parser.parse_args(argv)
+
+    fires, outages = {}, {}
+    for spec in args.fire:
+        sensor_id, start, *rate = spec.split(":")
+        fires.setdefault(sensor_id, []).append((float(start), float(rate[0]) if rate else FIRE_RATE, FIRE_PEAK))
+    for spec in args.outage:
+        sensor_id, start, end = spec.split(":")
+        outages.setdefault(sensor_id, []).append((float(start), float(end)))
+    seed = random.Random(args.seed)
+    sensors = []
+    for i in range(args.sensors):
+        sensor_id = f"emu-{i}"
+        sensor_seed = seed.random() if args.seed is not None else None
+        sensors.append(VirtualSensor(sensor_id, temperature_curve(fires=fires.get(sensor_id, ()), seed=sensor_seed),
+                                     latency=args.latency, error_rate=args.error_rate,
+                                     outages=outages.get(sensor_id, ()), seed=sensor_seed))
+
+    push_to = None
+    if args.push:
+        host, port = args.push.rsplit(":", 1)
+        push_to = (host, int(port))
+    farm = EmulatorFarm(sensors, args.host, args.port, args.per_port, push_to, binary=not args.text)
+    farm.start()
+    print(f"{len(sensors)} boards up, e.g. {next(iter(farm.endpoints.values()), '-')}")
+    try:
+        if args.measure:
+            measure(farm, args.measure, push_to[1] if push_to else None)
+        else:
+            while True:
+                time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        farm.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+from concurrent.futures import ProcessPoolExecutor
+from types import SimpleNamespace
+
+import numpy as np
+
+rng = np.random.default_rng()
+
+ETA_QUANTILES = (0.1, 0.5, 0.9)  # p10 / p50 / p90 fire arrival
+
+
+# Function to let a set of burning nodes each spread to one neighbour
+def _spread_from(core, burning, sources, rng):
+    """Core of the spread kernel on a flat (scenarios * n) fire mask.
+
+    sources are flat ids (scenario * n + node) of burning nodes. Returns the
+    flat ids they ignite and a mask of the sources that still had an unburnt
+    neighbour, since a node with none left can never spread again.
+    """
+    n = len(core.indptr) - 1
+    scenario, node = np.divmod(sources, n)
+    start = core.indptr[node]
+    degree = core.indptr[node + 1] - start
+
+    # Expand every source into its CSR slots and keep the ones leading to unburnt nodes
+    owner = np.repeat(np.arange(len(sources)), degree)
+    slot = np.arange(len(owner)) + np.repeat(start - (np.cumsum(degree) - degree), degree)
+    targets = core.indices[slot]
+    open_slots = ~burning[scenario[owner] * n + targets]
+    owner = owner[open_slots]
+    targets = targets[open_slots]
+
+    # Slots stay grouped by source, so each source's candidates are a contiguous run
+    counts = np.bincount(owner, minlength=len(sources))
+    first = np.cumsum(counts) - counts
+    spreading = counts > 0
+    picks = first[spreading] + (rng.random(int(spreading.sum())) * counts[spreading]).astype(np.int64)
+
+    targets = targets[picks]
+    keep = ~core.exit[targets]
+    return (scenario[spreading] * n + targets)[keep], spreading
+
+# Function to spread the fire one step on a boolean fire mask
+def spread_fire_step(core, fire, rng=rng):
+    """Batched fire-spread kernel, returns the mask of newly ignited nodes.
+
+    Same rule as the old per-node loop: every burning node picks one neighbour
+    that is not on fire yet uniformly at random (stairwell edges are what link
+    the floors), and a pick that lands on an exit is wasted since exits never
+    ignite. All the picks are drawn in one call. fire may be a single (n,)
+    mask or a (scenarios, n) stack of independent fires.
+    """
+    burning = fire.ravel()
+    ignited, _ = _spread_from(core, burning, np.flatnonzero(burning), rng)
+    new_fire = np.zeros(burning.size, dtype=bool)
+    new_fire[ignited] = True
+    return new_fire.reshape(fire.shape)
+
+# Function to play out many independent fire futures side by side
+def simulate_fire_ensemble(core, fire, scenarios, steps, rng=rng):
+    """Return the spread step each node ignites at in every scenario.
+
+    The result is a (scenarios, n) int16 array, 0 for nodes already burning
+    and steps + 1 for nodes the fire doesn't reach within the horizon. Only
+    the fire front is expanded each step, never the burnt-out interior.
+    """
+    burning = np.repeat(fire[None, :], scenarios, axis=0).ravel()
+    ignition = np.where(burning, 0, steps + 1).astype(np.int16)
+    active = np.flatnonzero(burning)
+    stamp = np.zeros(burning.size, dtype=np.int64)
+    for step in range(1, steps + 1):
+        if not len(active):
+            break  # Every future has burnt out or been contained
+        ignited, spreading = _spread_from(core, burning, active, rng)
+        # Two nodes can pick the same neighbour, keep the last write of each without sorting
+        order = np.arange(len(ignited))
+        stamp[ignited] = order
+        ignited = ignited[stamp[ignited] == order]
+        burning[ignited] = True
+        ignition[ignited] = step
+        active = np.concatenate((active[spreading], ignited))
+    return ignition.reshape(scenarios, -1)
+
+def _simulate_chunk(indptr, indices, exit, fire, scenarios, steps, seed):
+    # Process pool worker, only ships the arrays the kernel needs
+    core = SimpleNamespace(indptr=indptr, indices=indices, exit=exit)
+    return simulate_fire_ensemble(core, fire, scenarios, steps, np.random.default_rng(seed))
+
+# Function to estimate fire arrival quantiles from a Monte Carlo ensemble
+def fire_eta_quantiles(core, fire, scenarios=1000, steps=64, ticks_per_step=1, quantiles=ETA_QUANTILES,
+                       chunk_size=512, processes=None, seed=None):
+    """Per-node fire ETA quantiles over independent futures of the current fire.
+
+    Returns a (len(quantiles), n) array in ticks (step * ticks_per_step); inf
+    means the fire doesn't get there within `steps` spread steps in that share
+    of futures. Scenarios run in chunks, across a process pool if processes is
+    set; only use that from a module with an `if __name__ == "__main__"` guard.
+    """
+    sizes = [min(chunk_size, scenarios - start) for start in range(0, scenarios, chunk_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    args = (core.indptr, core.indices, core.exit, fire)
+    if processes:
+        with ProcessPoolExecutor(processes) as pool:
+            chunks = list(pool.map(_simulate_chunk, *zip(*[args + (size, steps, s) for size, s in zip(sizes, seeds)])))
+    else:
+        chunks = [_simulate_chunk(*args, size, steps, s) for size, s in zip(sizes, seeds)]
+    ignition = np.concatenate(chunks)
+
+    # Order statistics rather than interpolation, so "never within the horizon" stays inf
+    ranks = np.minimum((np.asarray(quantiles) * scenarios).astype(np.int64), scenarios - 1)
+    ignition.sort(axis=0)
+    eta = ignition[ranks].astype(np.float64)
+    eta[eta > steps] = np.inf
+    return eta * ticks_per_step
@@ -0,0 +1,142 @@
+import heapq
+
+import numpy as np
+
+
+# Function to read (col, row, floor) out of a room name like "R2_1_3"
+def parse_room(name):
+    floor, row, col = name[1:].split("_")
+    return int(col), int(row), int(floor)
+
+
+class BuildingGraph:
+    """Integer-indexed building graph: CSR adjacency plus NumPy attribute columns.
+
+    Node i's neighbours are indices[indptr[i]:indptr[i + 1]] with matching
+    weights, and CSR slot k is directed edge k from edge_source[k] to
+    indices[k]. Room names like "R2_1_3" are only a lookup table (names,
+    index) for the edges of the system: networkx, sensors and labels.
+    """
+
+    def __init__(self, names, indptr, indices, weights, coords):
+        self.names = list(names)
+        self.index = {name: i for i, name in enumerate(self.names)}
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int64)
+        self.weights = np.asarray(weights, dtype=np.float64)
+        self.coords = np.asarray(coords, dtype=np.float64)  # (col, row, floor) per node
+        self.edge_source = np.repeat(np.arange(len(self.names)), np.diff(self.indptr))
+        # Sorted source * n + target keys, so whole arrays of pairs map to slots with one searchsorted
+        keys = self.edge_source * len(self.names) + self.indices
+        self._edge_order = np.argsort(keys, kind="stable")
+        self._edge_keys = keys[self._edge_order]
+
+        # Node attribute columns
+        n = len(self.names)
+        self.fire = np.zeros(n, dtype=bool)
+        self.exit = np.zeros(n, dtype=bool)
+        self.stairwell = np.zeros(n, dtype=bool)
+        self.warning = np.full(n, np.inf)
+        self.fire_eta = np.full(n, np.inf)
+        # Fire arrival bands from the Monte Carlo ensemble (fire.fire_eta_quantiles)
+        self.fire_eta_p10 = np.full(n, np.inf)
+        self.fire_eta_p50 = np.full(n, np.inf)
+        self.fire_eta_p90 = np.full(n, np.inf)
+        self.distance_to_safety = np.full(n, np.inf)
+
+        # Plain lists for the heap searches, Python indexes lists much faster than arrays
+        self.adjacency = [list(zip(self.indices[s:e].tolist(), self.weights[s:e].tolist()))
+                          for s, e in zip(self.indptr[:-1], self.indptr[1:])]
+        self.reverse_adjacency = self.adjacency
+        self.neighbor_weights = [dict(neighbors) for neighbors in self.adjacency]
+
+    @classmethod
+    def from_networkx(cls, G):
+        names = list(G.nodes)
+        index = {name: i for i, name in enumerate(names)}
+        succ = G.succ if G.is_directed() else G.adj
+        indptr = [0]
+        indices = []
+        weights = []
+        for name in names:
+            for neighbor, data in succ[name].items():
+                indices.append(index[neighbor])
+                weights.append(data.get("weight", 1))
+            indptr.append(len(indices))
+        coords = [G.nodes[name]["pos"] if "pos" in G.nodes[name] else parse_room(name) for name in names]
+        core = cls(names, indptr, indices, weights, coords)
+
+        for column in ("fire", "exit", "stairwell", "warning", "fire_eta", "distance_to_safety"):
+            values = [G.nodes[name].get(column) for name in names]
+            if all(value is not None for value in values):
+                getattr(core, column)[:] = values
+        if G.is_directed():
+            # Searches towards the exits walk edges backwards
+            core.reverse_adjacency = [[] for _ in names]
+            for u, neighbors in enumerate(core.adjacency):
+                for v, weight in neighbors:
+                    core.reverse_adjacency[v].append((u, weight))
+        return core
+
+    def __len__(self):
+        return len(self.names)
+
+    def ids(self, names):
+        return np.fromiter((self.index[name] for name in names), dtype=np.int64)
+
+    def mask(self, names):
+        mask = np.zeros(len(self.names), dtype=bool)
+        mask[self.ids(names)] = True
+        return mask
+
+    def names_of(self, ids):
+        return [self.names[i] for i in np.asarray(ids).tolist()]
+
+    def neighbors(self, node):
+        return self.indices[self.indptr[node]:self.indptr[node + 1]]
+
+    def edge_id(self, u, v):
+        start = self.indptr[u]
+        return start + int(np.flatnonzero(self.indices[start:self.indptr[u + 1]] == v)[0])
+
+    def edge_ids(self, u, v):
+        """Slot ids of the directed edges u[i] -> v[i]; KeyError if any of them is not an edge."""
+        keys = np.asarray(u, dtype=np.int64) * len(self.names) + np.asarray(v, dtype=np.int64)
+        found = np.minimum(np.searchsorted(self._edge_keys, keys), max(len(self._edge_keys) - 1, 0))
+        missing = np.flatnonzero(self._edge_keys[found] != keys) if len(self._edge_keys) else np.arange(keys.size)
+        if len(missing):
+            source, target = divmod(int(keys.flat[missing[0]]), len(self.names))
+            raise KeyError(f"no edge {self.names[source]} -> {self.names[target]}")
+        return self._edge_order[found]
+
+    def reverse_edge_ids(self, slots=None):
+        """Slot of v -> u for each slot u -> v (every slot if slots is None), -1 where the graph has no way back."""
+        slots = np.arange(len(self.indices)) if slots is None else np.asarray(slots, dtype=np.int64)
+        keys = self.indices[slots] * len(self.names) + self.edge_source[slots]
+        found = np.minimum(np.searchsorted(self._edge_keys, keys), max(len(self._edge_keys) - 1, 0))
+        return np.where(self._edge_keys[found] == keys, self._edge_order[found], -1)
+
+    def weight(self, u, v):
+        return self.neighbor_weights[u][v]
+
+    def distances_from(self, sources, blocked=None, reverse=False):
+        """Dijkstra from one or more source ids; unreachable nodes stay at inf."""
+        adjacency = self.reverse_adjacency if reverse else self.adjacency
+        blocked = blocked.tolist() if blocked is not None else [False] * len(self.names)
+        distance = [float('inf')] * len(self.names)
+        heap = []
+        for source in np.atleast_1d(sources).tolist():
+            if not blocked[source]:
+                distance[source] = 0.0
+                heap.append((0.0, source))
+        heapq.heapify(heap)
+        while heap:
+            dist, node = heapq.heappop(heap)
+            if dist > distance[node]:
+                continue
+            for neighbor, weight in adjacency[node]:
+                new_dist = dist + weight
+                if new_dist < distance[neighbor] and not blocked[neighbor]:
+                    distance[neighbor] = new_dist
+                    heapq.heappush(heap, (new_dist, neighbor))
+        return np.array(distance)
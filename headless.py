@@ -0,0 +1,163 @@
+"""Run the fire/route/person model without importing any plotting code.
+
+    python headless.py --ticks 600 --out run.jsonl      # one JSON line per tick
+    python headless.py --view                           # same model in real time, with the 3D window
+    python headless.py --replay sensors.log --view --speed 100   # recorded incident at 100x
+    python headless.py --signage 192.168.4.20:9760       # drive door signs, one per directed edge
+    python headless.py --occupants 100000 --ticks 300        # evacuate a full building
+    python headless.py --view --metrics-port 9109            # stage latencies at http://127.0.0.1:9109/metrics
+    python headless.py --plan --occupants 500                # print a door-capacity evacuation plan and exit
+    python headless.py --ensemble 500 --out run.jsonl        # plan against the early (p10) of 500 fire futures
+"""
+import argparse
+import json
+import sys
+
+import numpy as np
+
+from building import SENSORS, grid_building
+from evacuation import default_capacities, plan_evacuation
+from graph_core import BuildingGraph
+from metrics import DUMP_SECONDS, MetricsDump, MetricsServer
+from signage import SignageOutput, sign_edges, sign_transport
+from simulation import FIRE_ENSEMBLE_SIZE, TICK_SPEED, Simulation, SimulationClock
+
+
+# Function to turn a snapshot into a JSON-friendly record
+def snapshot_record(core, snapshot):
+    return {
+        "tick": snapshot.tick,
+        "fire": core.names_of(snapshot.fire.nonzero()[0]),
+        "blocked": core.names_of(snapshot.blocked.nonzero()[0]),
+        "person": core.names[snapshot.person_node],
+        "position": [float(x) for x in snapshot.person_position],
+        "edge_states": snapshot.edge_states.tolist(),  # routing state code per directed edge (core CSR slot)
+        "changed_edges": snapshot.changed_edges.tolist(),  # slots changed since the previous emitted tick
+    }
+
+# Function to plan routes and departures for everyone in the simulation under door and stair capacities
+def evacuation_plan(simulation):
+    core = simulation.core
+    simulation.calculate_fire_eta()
+    nodes, counts = np.unique(simulation.crowd.node, return_counts=True)
+    occupants = dict(zip(core.names_of(nodes), counts.tolist()))
+    seconds = simulation.tick_speed / 1000  # fire_eta is in ticks, the plan works in edge weights (seconds)
+    fire_eta = {name: eta * seconds for name, eta in zip(core.names, core.fire_eta.tolist())}
+    return plan_evacuation(simulation.G, occupants, core.names_of(np.flatnonzero(core.exit)),
+                           default_capacities(simulation.G, set(core.names_of(np.flatnonzero(core.stairwell)))),
+                           core.names_of(np.flatnonzero(core.fire)), fire_eta)
+
+# Function to print an evacuation plan one group per line
+def print_plan(plan):
+    for count, path, departures, arrival in plan.groups:
+        leaves = departures[0] * plan.time_step if departures else 0
+        print(f"{count:5d} from {path[0]:<8} leave {leaves:6g} s  out {arrival * plan.time_step:6g} s  "
+              f"{' -> '.join(path)}")
+    for node, count in sorted(plan.stranded.items()):
+        print(f"{count:5d} from {node:<8} stranded")
+    print(f"{plan.evacuated} evacuated, {sum(plan.stranded.values())} stranded, last out after {plan.makespan:g} s",
+          file=sys.stderr)
+
+# Function to step the model as fast as possible and hand states to a callback
+def run_headless(simulation, ticks, callback=None, every=1):
+    """Advance ticks steps; callback(snapshot) gets every `every`-th tick and the last one."""
+    for _ in range(ticks):
+        simulation.step()
+        if callback is not None and (simulation.tick % every == 0 or simulation.tick == ticks):
+            callback(simulation.snapshot())
+    return simulation.snapshot()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--ticks", type=int, default=600, help="ticks to run (ignored with --view)")
+    parser.add_argument("--tick-speed", type=int, default=TICK_SPEED, help="milliseconds of simulated time per tick")
+    parser.add_argument("--ensemble", type=int, default=FIRE_ENSEMBLE_SIZE,
+                        help="fire futures per ETA update (e.g. 500), 0 for one sample")
+    parser.add_argument("--out", help="write one JSON line per emitted tick here ('-' for stdout)")
+    parser.add_argument("--every", type=int, default=1, help="only emit every Nth tick")
+    parser.add_argument("--view", action="store_true", help="open the 3D view and run on the wall clock")
+    parser.add_argument("--speed", type=float, default=1.0, help="simulated seconds per second with --view")
+    parser.add_argument("--replay", help="feed a sensor log recorded by real_final.py in as the only source of fire")
+    parser.add_argument("--signage", metavar="TARGET",
+                        help="send door-sign frames to a serial device, host:port (UDP) or 'loopback'")
+    parser.add_argument("--occupants", type=int, default=0, help="extra occupants placed in random rooms")
+    parser.add_argument("--plan", action="store_true",
+                        help="print capacity-aware routes and departure times for everyone, then exit")
+    parser.add_argument("--metrics-port", type=int, help="serve Prometheus metrics on this local port")
+    parser.add_argument("--metrics-file", help=f"rewrite Prometheus metrics to this file every {DUMP_SECONDS:g} s")
+    args = parser.parse_args(argv)
+
+    replay = None
+    if args.replay:
+        # The sensor stack pulls in aiohttp, so it is only imported for replays
+        from sensor_log import SensorReplay
+        from sensors import SensorFeed, SensorRegistry
+        G = grid_building(fire_nodes=())
+        core = BuildingGraph.from_networkx(G)
+        replay = SensorReplay(args.replay, SensorFeed(SensorRegistry.from_table(core, SENSORS)), args.tick_speed)
+    else:
+        G = grid_building()
+        core = BuildingGraph.from_networkx(G)
+    occupants = np.random.default_rng().integers(0, len(core), args.occupants)
+    simulation = Simulation(G, core, core.index["R2_0_0"], args.tick_speed, args.ensemble, sensors=replay,
+                            occupants=occupants)
+    signage = SignageOutput(sign_edges(core), sign_transport(args.signage)) if args.signage else None
+    if args.plan:
+        print_plan(evacuation_plan(simulation))
+        return
+    exporters = []
+    if args.metrics_port is not None:
+        exporters.append(MetricsServer(simulation.metrics, port=args.metrics_port))
+    if args.metrics_file:
+        exporters.append(MetricsDump(simulation.metrics, args.metrics_file))
+    for exporter in exporters:
+        exporter.start()
+
+    if args.view:
+        # Plotting is only imported once a window is actually wanted
+        from render import show
+        clock = SimulationClock(simulation, args.speed)
+        clock.start()
+        if signage is not None:
+            signage.start(clock)
+        show(clock)
+        clock.stop()
+        if signage is not None:
+            signage.stop()
+        for exporter in exporters:
+            exporter.stop()
+        return
+
+    out = None
+    if args.out:
+        out = sys.stdout if args.out == "-" else open(args.out, "w")
+
+    def emit(snapshot):
+        if signage is not None:
+            signage.publish(snapshot.edge_states)
+        if out is not None and (snapshot.tick % args.every == 0 or snapshot.tick == args.ticks):
+            out.write(json.dumps(snapshot_record(core, snapshot)) + "\n")
+    try:
+        # Signs see every tick, the JSON lines only every --every
+        snapshot = run_headless(simulation, args.ticks, emit if out or signage else None,
+                                1 if signage else args.every)
+    finally:
+        if out not in (None, sys.stdout):
+            out.close()
+        if signage is not None:
+            signage.stop()
+        for exporter in exporters:
+            exporter.stop()
+    print(f"{snapshot.tick} ticks, {int(snapshot.fire.sum())} of {len(core)} rooms on fire, "
+          f"person at {core.names[snapshot.person_node]}", file=sys.stderr)
+    if args.occupants:
+        print(f"{int(core.exit[snapshot.occupant_nodes].sum())} of {len(snapshot.occupant_nodes)} occupants at an exit, "
+              f"{simulation.crowd.queued} queuing at a door", file=sys.stderr)
+    if replay is not None:
+        print(f"replayed {replay.position} of {len(replay.log)} readings", file=sys.stderr)
+    if signage is not None:
+        print(f"{len(signage.edges)} signs, {signage.bytes_sent} bytes of sign messages", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
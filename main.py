@@ -1,8 +1,12 @@
 import networkx as nx
 import matplotlib.pyplot as plt
 import random
+import numpy as np
 from mpl_toolkits.mplot3d import Axes3D
 from matplotlib.animation import FuncAnimation
+from fire import spread_fire_step
+from graph_core import BuildingGraph
+from routing import find_timed_paths, RouteTree
 
 # Building configuration
 FLOORS = 3
@@ -22,7 +26,7 @@ fire_nodes = set(initial_fire_nodes)
 
 # Add nodes to graph
 for node in nodes:
-    G.add_node(node, exit=node in exit_nodes, fire=node in fire_nodes, stairwell=node in stairwell_nodes, warning=float('inf'), distance_to_safety=float('inf'))
+    G.add_node(node, exit=node in exit_nodes, fire=node in fire_nodes, stairwell=node in stairwell_nodes, warning=float('inf'), fire_eta=float('inf'), distance_to_safety=float('inf'))
 
 # Connect rooms within the same floor (bidirectional)
 for floor in range(FLOORS):
@@ -39,91 +43,32 @@ for floor in range(FLOORS - 1):
     lower, upper = f"R{floor}_{stairwell_row}_{stairwell_col}", f"R{floor + 1}_{stairwell_row}_{stairwell_col}"
     G.add_edge(lower, upper, weight=4)
 
-# Function to find safest paths
-def find_safest_paths(G, exit_nodes):
-    safe_paths = {}
-    blocked_nodes = set()
-    for node in G.nodes:
-        if node in exit_nodes:
-            safe_paths[node] = None
-            continue
-        valid_paths = []
-        for exit_node in exit_nodes:
-            try:
-                paths = list(nx.all_simple_paths(G, source=node, target=exit_node))
-                for path in paths:
-                    if all(n not in fire_nodes for n in path):
-                        valid_paths.append(path)
-            except nx.NetworkXNoPath:
-                continue
-        safe_paths[node] = min(valid_paths, key=lambda p: sum(G.edges[edge]['weight'] for edge in zip(p[:-1], p[1:]))) if valid_paths else None
-        if not safe_paths[node]:
-            blocked_nodes.add(node)
-    return safe_paths, blocked_nodes
+# Integer-indexed core the simulation runs on, room names are only a lookup table
+core = BuildingGraph.from_networkx(G)
 
 # Fire spread function
 def spread_fire():
-    new_fire_nodes = set()
-    for node in fire_nodes:
-        floor, row, col = map(int, node[1:].split("_"))
-        neighbors = [
-            f"R{floor}_{row+1}_{col}", f"R{floor}_{row-1}_{col}",
-            f"R{floor}_{row}_{col+1}", f"R{floor}_{row}_{col-1}"
-        ]
-        if node in stairwell_nodes and floor < FLOORS - 1:
-            neighbors.append(f"R{floor+1}_{row}_{col}")
-        if node in stairwell_nodes and floor > 0:
-            neighbors.append(f"R{floor-1}_{row}_{col}")
-        
-        # Filter neighbors that are not on fire yet
-        uninfected_neighbors = [n for n in neighbors if n not in fire_nodes and n in G.nodes]
-        
-        # If there are any uninfected neighbors, randomly pick one to infect
-        if uninfected_neighbors:
-            new_fire_node = random.choice(uninfected_neighbors)
-            if new_fire_node not in exit_nodes:
-                new_fire_nodes.add(new_fire_node)
-    
-    # Update fire nodes
-    fire_nodes.update(new_fire_nodes)
-    for node in fire_nodes:
-        G.nodes[node]["fire"] = True
+    core.fire |= spread_fire_step(core, core.fire)
 
 # Function to calculate fire ETA for each node based on the safest path
-def calculate_fire_eta(G, fire_nodes, tick_speed):
-    # Initialize all warnings to infinity
-    for node in G.nodes:
-        G.nodes[node]["warning"] = float('inf')
-    
-    # For each fire node, calculate the shortest path to all other nodes
-    for fire_node in fire_nodes:
-        lengths = nx.single_source_dijkstra_path_length(G, fire_node, weight='weight')
-        for node, length in lengths.items():
-            # Scale the warning time by tick speed and add randomness
-            fire_spread_rate = 1  # Random fire spread rate
-            # fire_spread_rate = random.uniform(0.5, 1.5)  # Random fire spread rate
-            
-            warning_time = (length * (1000 / tick_speed)) / fire_spread_rate
-            if warning_time < G.nodes[node]["warning"]:
-                G.nodes[node]["warning"] = warning_time
-
-    # Update warning values to reflect the minimum fire spread value along the safest path
-    safe_paths, _ = find_safest_paths(G, exit_nodes)
-    for node, path in safe_paths.items():
-        if path:
-            # Find the minimum fire spread value along the safest path
-            min_fire_warning = min(G.nodes[n]["warning"] for n in path)
-            G.nodes[node]["warning"] = min_fire_warning
+def calculate_fire_eta(core, tick_speed, route_tree):
+    # One multi-source Dijkstra from every burning room gives the distance to the nearest fire
+    lengths = core.distances_from(np.flatnonzero(core.fire))
+    # Scale the warning time by tick speed and add randomness
+    fire_spread_rate = 1  # Random fire spread rate
+    # fire_spread_rate = np.random.uniform(0.5, 1.5, len(core))  # Random fire spread rate
+    # Keep the raw fire arrival time for the time-dependent router
+    core.fire_eta[:] = (lengths * (1000 / tick_speed)) / fire_spread_rate
+
+    # Update warning values to reflect the minimum fire spread value along the safest path,
+    # read off the live route tree instead of rebuilding one
+    route_tree.update(core.fire)
+    core.warning[:] = route_tree.path_min(core.fire_eta)
 
 # Function to calculate distance to safety (exit) for each node
-def calculate_distance_to_safety(G, exit_nodes):
-    for node in G.nodes:
-        G.nodes[node]["distance_to_safety"] = float('inf')
-    for exit_node in exit_nodes:
-        lengths = nx.single_source_dijkstra_path_length(G, exit_node, weight='weight')
-        for node, length in lengths.items():
-            if length < G.nodes[node]["distance_to_safety"]:
-                G.nodes[node]["distance_to_safety"] = length
+def calculate_distance_to_safety(core):
+    # One multi-source Dijkstra from every exit, walking edges towards them
+    core.distance_to_safety[:] = core.distances_from(np.flatnonzero(core.exit), reverse=True)
 
 class Person:
     def __init__(self, start_node, pos):
@@ -143,13 +88,13 @@ class Person:
                 self.target_node = path[1]
                 self.t = 0  # Reset interpolation factor
                 # Update speed based on edge weight and tick speed
-                edge_weight = G.edges[self.current_node, self.target_node]['weight']
+                edge_weight = core.weight(self.current_node, self.target_node)
                 self.speed = 1 / (edge_weight * (1000 / tick_speed))  # Speed is inversely proportional to weight
             else:
                 self.target_node = None  # No movement if no path found
 
     def update_position(self):
-        if self.target_node:
+        if self.target_node is not None:
             start_pos = self.pos[self.current_node]
             end_pos = self.pos[self.target_node]
             
@@ -165,11 +110,15 @@ class Person:
                 self.current_node = self.target_node
                 self.t = 0  # Reset for next movement
 
-# Assign 3D positions
-pos = {node: (int(node.split("_")[2]), int(node.split("_")[1]), int(node.split("_")[0][1:])) for node in G.nodes}
+# Assign 3D positions, (col, row, floor) per node id
+pos = core.coords
 
 # Initialize person
-person = Person("R2_0_0", pos)
+person = Person(core.index["R2_0_0"], pos)
+
+# Exit-rooted route tree, repaired in place as the fire spreads
+route_tree = RouteTree(core)
+timed_paths = [None] * len(core)  # Routes that stay ahead of the fire front
 
 # 3D Visualization
 fig = plt.figure(figsize=(10, 7))
@@ -180,7 +129,7 @@ time_since_fire = 0
 tick_speed = 500  # Milliseconds per tick
 
 def update(frame):
-    global fire_spread_time, time_since_fire, tick_speed, paused
+    global fire_spread_time, time_since_fire, tick_speed, paused, timed_paths
     
     if paused:
         return  # Skip updating when paused
@@ -189,29 +138,29 @@ def update(frame):
     time_since_fire += 1
     if fire_spread_time >= 2 * (1000 / tick_speed):  # Fire spreads every 2 seconds
         spread_fire()
-        calculate_fire_eta(G, fire_nodes, tick_speed)  # Update fire ETA for all nodes
-        calculate_distance_to_safety(G, exit_nodes)  # Update distance to safety for all nodes
+        calculate_fire_eta(core, tick_speed, route_tree)  # Update fire ETA for all nodes
+        calculate_distance_to_safety(core)  # Update distance to safety for all nodes
         fire_spread_time = 0    
     fire_spread_time += 1 
 
-    safe_paths, blocked_nodes = find_safest_paths(G, exit_nodes)
+    changed_nodes = route_tree.update(core.fire)  # Only reroutes nodes cut off by new fire
+    if len(changed_nodes) or fire_spread_time == 1:  # Fire front moved, re-plan against its ETA
+        timed_paths, _ = find_timed_paths(core, core.fire, core.fire_eta, tick_speed, route_tree)
+    blocked_nodes = route_tree.blocked
+    # Prefer routes that outrun the fire, fall back to the shortest one
+    safe_paths = [timed or path for timed, path in zip(timed_paths, route_tree.paths)]
     
     # Move the person gradually
     person.update_position()
     person.move(safe_paths)
     
     # Node colors based on fire, exit, warning, and blocked status
-    node_colors = [
-        "red" if G.nodes[n]["fire"] else
-        "blue" if G.nodes[n]["exit"] else
-        "orange" if n in blocked_nodes else
-        "yellow" if G.nodes[n]["warning"] < G.nodes[n]["distance_to_safety"] else
-        "green" for n in G.nodes
-    ]
-
-    for node, (x, y, z) in pos.items():
-        color = node_colors[list(G.nodes).index(node)]
-        ax.scatter(x, y, z, color=color, s=200)
+    node_colors = np.select(
+        [core.fire, core.exit, blocked_nodes, core.warning < core.distance_to_safety],
+        ["red", "blue", "orange", "yellow"], "green")
+
+    for node, (x, y, z) in enumerate(pos):
+        ax.scatter(x, y, z, color=node_colors[node], s=200)
 
         # Get node attributes
         # distance_to_safety = G.nodes[node]["distance_to_safety"]
@@ -223,11 +172,12 @@ def update(frame):
         # # Display warning time (fire ETA) below the node
         # ax.text(x, y, z - 0.3, f"{fire_eta:.1f}", color="red", fontsize=10, ha="center")
 
-    for edge in G.edges:
-        x_vals, y_vals, z_vals = zip(*[pos[edge[0]], pos[edge[1]]])
-        ax.plot(x_vals, y_vals, z_vals, "gray")
+    for u, v in zip(core.edge_source, core.indices):
+        if u < v:
+            x_vals, y_vals, z_vals = zip(pos[u], pos[v])
+            ax.plot(x_vals, y_vals, z_vals, "gray")
     
-    for node, path in safe_paths.items():
+    for path in safe_paths:
         if path and len(path) > 1:
             for i in range(len(path) - 1):
                 x_vals, y_vals, z_vals = zip(*[pos[path[i]], pos[path[i+1]]])
@@ -0,0 +1,185 @@
+import bisect
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+METRICS_PORT = 9109  # Local port of the Prometheus text endpoint
+DUMP_SECONDS = 10.0  # How often MetricsDump rewrites its file
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)  # Seconds
+LAG_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0, 60.0)  # Seconds from reading taken to applied
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram in the Prometheus layout, safe to observe from any thread."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # Per bucket, the last one above every bound
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        bucket = bisect.bisect_left(self.buckets, value)  # Bounds are inclusive (le)
+        with self._lock:
+            self.counts[bucket] += 1
+            self.sum += value
+            self.count += 1
+
+    def observe_many(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        if not len(values):
+            return
+        counts = np.bincount(np.searchsorted(self.buckets, values), minlength=len(self.counts))
+        with self._lock:
+            self.counts = [old + new for old, new in zip(self.counts, counts.tolist())]
+            self.sum += float(values.sum())
+            self.count += len(values)
+
+    def lines(self, name, labels=""):
+        with self._lock:
+            counts, total, count = list(self.counts), self.sum, self.count
+        separator = "," if labels else ""
+        cumulative = np.cumsum(counts).tolist()
+        bounds = [repr(float(bound)) for bound in self.buckets] + ["+Inf"]
+        lines = [f'{name}_bucket{{{labels}{separator}le="{bound}"}} {n}' for bound, n in zip(bounds, cumulative)]
+        suffix = f"{{{labels}}}" if labels else ""
+        return lines + [f"{name}_sum{suffix} {total!r}", f"{name}_count{suffix} {count}"]
+
+
+class StageTimer:
+    """Context manager timing one stage into its histogram; one per stage, reused every tick."""
+    __slots__ = ("histogram", "started")
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+        self.started = 0.0
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started)
+
+
+class Metrics:
+    """Instrumentation for the tick loop, rendered in the Prometheus text format.
+
+    Stage latencies go into one histogram per stage (evac_stage_seconds),
+    counters are bumped where things happen, and gauges are read through
+    callbacks only when the metrics are rendered, so they cost nothing per
+    tick. Timing a stage costs a couple of microseconds.
+    """
+
+    def __init__(self):
+        self.stages = {}  # Stage name -> StageTimer
+        self.histograms = {}  # Name -> (help, Histogram)
+        self.counters = {}  # Name -> (help, [value])
+        self.gauges = {}  # Name -> (help, read())
+        self._lock = threading.Lock()
+
+    def stage(self, name):
+        """Timer for one stage of the tick loop, use as `with metrics.stage("fire_eta"):`."""
+        timer = self.stages.get(name)
+        if timer is None:
+            timer = self.stages.setdefault(name, StageTimer(Histogram()))
+        return timer
+
+    def histogram(self, name, help, buckets=LATENCY_BUCKETS):
+        if name not in self.histograms:
+            self.histograms[name] = (help, Histogram(buckets))
+        return self.histograms[name][1]
+
+    def counter(self, name, help):
+        self.counters.setdefault(name, (help, [0]))
+
+    def count(self, name, amount=1):
+        with self._lock:
+            self.counters[name][1][0] += amount
+
+    def gauge(self, name, help, read):
+        self.gauges[name] = (help, read)
+
+    def render(self):
+        """Every metric in the Prometheus text exposition format."""
+        lines = ["# HELP evac_stage_seconds Time spent in each stage of the tick loop",
+                 "# TYPE evac_stage_seconds histogram"]
+        for name, timer in list(self.stages.items()):
+            lines += timer.histogram.lines("evac_stage_seconds", f'stage="{name}"')
+        for name, (help, histogram) in list(self.histograms.items()):
+            lines += [f"# HELP {name} {help}", f"# TYPE {name} histogram"] + histogram.lines(name)
+        for name, (help, value) in list(self.counters.items()):
+            lines += [f"# HELP {name} {help}", f"# TYPE {name} counter", f"{name} {value[0]}"]
+        for name, (help, read) in list(self.gauges.items()):
+            lines += [f"# HELP {name} {help}", f"# TYPE {name} gauge", f"{name} {read()!r}"]
+        return "\n".join(lines) + "\n"
+
+
+class MetricsServer:
+    """Serves Metrics.render() at http://host:port/metrics from a background thread."""
+
+    def __init__(self, metrics, host="127.0.0.1", port=METRICS_PORT):
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # Scrapes every few seconds would flood the console
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.port = self.httpd.server_address[1]  # The one picked when port is 0
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+
+class MetricsDump:
+    """Rewrites a file with Metrics.render() every `every` seconds, for node_exporter's textfile collector or tail."""
+
+    def __init__(self, metrics, path, every=DUMP_SECONDS):
+        self.metrics = metrics
+        self.path = path
+        self.every = every
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def write(self):
+        # Written aside and renamed, so a reader never sees half a file
+        temporary = f"{self.path}.tmp"
+        with open(temporary, "w") as f:
+            f.write(self.metrics.render())
+        os.replace(temporary, self.path)
+
+    def start(self):
+        def run():
+            while not self._stopped.wait(self.every):
+                self.write()
+        self._stopped.clear()
+        self._thread = threading.Thread(target=run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.write()  # The final numbers
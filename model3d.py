@@ -4,11 +4,14 @@ import random
 import time
 from mpl_toolkits.mplot3d import Axes3D
 from matplotlib.animation import FuncAnimation
-import requests
-import threading
+import numpy as np
+from fire import spread_fire_step
+from graph_core import BuildingGraph
+from routing import RouteTree
+from sensors import SensorFeed, SensorPoller, SensorRegistry
 
-# IP of ESP32-S2 Mini
-url = "http://172.30.175.227/data"
+# Sensor id -> IP of each ESP32-S2 Mini
+SENSOR_URLS = {"esp32-0": "http://172.30.175.227/data"}
 
 # Building configuration
 FLOORS = 3
@@ -19,25 +22,6 @@ FIRE_THRESHOLD = 28.5
 # Create graph
 G = nx.DiGraph()
 
-def get_temperature():
-    """Fetch sensor data from ESP32 and return temperature as float."""
-    while True:
-        try:
-            response = requests.get(url)
-            if response.status_code == 200:
-                temperature = response.text.split(" ")[1].split("\n")[0]
-                temperature = float(temperature[:-3])  # Remove unwanted characters
-                print(temperature)
-                if temperature > FIRE_THRESHOLD:
-                    print("FIRE!!!!!")
-                    fire_nodes.add(nodes[30])
-            else:
-                print(f"Error: Unable to fetch data (Status code: {response.status_code})")
-                return None
-        except Exception as e:
-            print(f"Error: {e}")
-            return None
-    
 
 
 # Generate nodes
@@ -68,55 +52,17 @@ for floor in range(FLOORS - 1):
     G.add_edge(lower, upper, weight=1)
     G.add_edge(upper, lower, weight=1)
 
-# Function to find safest paths
-def find_safest_paths(G, exit_nodes):
-    safe_paths = {}
-    blocked_nodes = set()
-    for node in G.nodes:
-        if node in exit_nodes:
-            safe_paths[node] = None
-            continue
-        valid_paths = []
-        for exit_node in exit_nodes:
-            try:
-                paths = list(nx.all_simple_paths(G, source=node, target=exit_node))
-                for path in paths:
-                    if all(n not in fire_nodes for n in path):
-                        valid_paths.append(path)
-            except nx.NetworkXNoPath:
-                continue
-        safe_paths[node] = min(valid_paths, key=len) if valid_paths else None
-        if not safe_paths[node]:
-            blocked_nodes.add(node)
-    return safe_paths, blocked_nodes
+# Integer-indexed core the simulation runs on, room names are only a lookup table
+core = BuildingGraph.from_networkx(G)
+
+# Readings queue up in the feed and hit the fire state once per frame
+registry = SensorRegistry(core)
+registry.register("esp32-0", [nodes[30]], FIRE_THRESHOLD)
+sensor_feed = SensorFeed(registry)
 
 # Fire spread function
 def spread_fire():
-    new_fire_nodes = set()
-    for node in fire_nodes:
-        floor, row, col = map(int, node[1:].split("_"))
-        neighbors = [
-            f"R{floor}_{row+1}_{col}", f"R{floor}_{row-1}_{col}",
-            f"R{floor}_{row}_{col+1}", f"R{floor}_{row}_{col-1}"
-        ]
-        if node in stairwell_nodes and floor < FLOORS - 1:
-            neighbors.append(f"R{floor+1}_{row}_{col}")
-        if node in stairwell_nodes and floor > 0:
-            neighbors.append(f"R{floor-1}_{row}_{col}")
-        
-        # Filter neighbors that are not on fire yet
-        uninfected_neighbors = [n for n in neighbors if n not in fire_nodes and n in G.nodes]
-        
-        # If there are any uninfected neighbors, randomly pick one to infect
-        if uninfected_neighbors:
-            new_fire_node = random.choice(uninfected_neighbors)
-            if new_fire_node not in exit_nodes:
-                new_fire_nodes.add(new_fire_node)
-    
-    # Update fire nodes
-    fire_nodes.update(new_fire_nodes)
-    for node in fire_nodes:
-        G.nodes[node]["fire"] = True
+    core.fire |= spread_fire_step(core, core.fire)
 
 
 class Person:
@@ -139,7 +85,7 @@ class Person:
                 self.target_node = None  # No movement if no path found
 
     def update_position(self, speed=0.1):
-        if self.target_node:
+        if self.target_node is not None:
             start_pos = self.pos[self.current_node]
             end_pos = self.pos[self.target_node]
             
@@ -156,11 +102,15 @@ class Person:
                 self.t = 0  # Reset for next movement
 
 
-pos = {node: (int(node.split("_")[2]), int(node.split("_")[1]), int(node.split("_")[0][1:])) for node in G.nodes}
+# Assign 3D positions, (col, row, floor) per node id
+pos = core.coords
 
 
 # Initialize person
-person = Person("R2_0_0", pos)
+person = Person(core.index["R2_0_0"], pos)
+
+# Exit-rooted route tree, repaired in place as the fire spreads
+route_tree = RouteTree(core)
 
 # 3D Visualization
 fig = plt.figure(figsize=(10, 7))
@@ -171,8 +121,6 @@ fire_spread_time = 1
 time_since_fire = 0
 
 
-# Assign 3D positions
-pos = {node: (int(node.split("_")[2]), int(node.split("_")[1]), int(node.split("_")[0][1:])) for node in G.nodes}
 def update(frame):
     global fire_spread_time
     global time_since_fire
@@ -183,7 +131,9 @@ def update(frame):
         fire_spread_time = 0    
     fire_spread_time += 1 
 
-    safe_paths, blocked_nodes = find_safest_paths(G, exit_nodes)
+    core.fire |= sensor_feed.drain_fire_mask()  # Apply the sensor batch as one update
+    route_tree.update(core.fire)  # Only reroutes nodes cut off by new fire
+    safe_paths, blocked_nodes = route_tree.paths, route_tree.blocked
     
     # Move the person gradually
     
@@ -195,22 +145,19 @@ def update(frame):
     
     # G.nodes[n]["warning"] = 20 // eta time of arrival of fireat that node
 
-    node_colors = [
-        "red" if G.nodes[n]["fire"] else
-        "blue" if G.nodes[n]["exit"] else
-        "orange" if n in blocked_nodes else
-        "green" for n in G.nodes
-    ]
+    node_colors = np.select(
+        [core.fire, core.exit, blocked_nodes],
+        ["red", "blue", "orange"], "green")
 
-    for node, (x, y, z) in pos.items():
-        color = node_colors[list(G.nodes).index(node)]
-        ax.scatter(x, y, z, color=color, s=200)
+    for node, (x, y, z) in enumerate(pos):
+        ax.scatter(x, y, z, color=node_colors[node], s=200)
 
-    for edge in G.edges:
-        x_vals, y_vals, z_vals = zip(*[pos[edge[0]], pos[edge[1]]])
-        ax.plot(x_vals, y_vals, z_vals, "gray")
+    for u, v in zip(core.edge_source, core.indices):
+        if u < v:
+            x_vals, y_vals, z_vals = zip(pos[u], pos[v])
+            ax.plot(x_vals, y_vals, z_vals, "gray")
     
-    for node, path in safe_paths.items():
+    for path in safe_paths:
         if path and len(path) > 1:
             for i in range(len(path) - 1):
                 x_vals, y_vals, z_vals = zip(*[pos[path[i]], pos[path[i+1]]])
@@ -224,7 +171,7 @@ def update(frame):
     ax.set_zlabel("Floor")
     ax.set_title(f"Time Step: {frame+1}")
 
-threading.Thread(target=get_temperature, daemon=True).start()
+SensorPoller(SENSOR_URLS, sensor_feed.put).start()
 
 ani = FuncAnimation(fig, update, interval=500)
 plt.show()
@@ -0,0 +1,136 @@
+import matplotlib.pyplot as plt
+import numpy as np
+from matplotlib.animation import FuncAnimation
+from mpl_toolkits.mplot3d.art3d import Line3DCollection
+
+from routing import FIRE_AHEAD, GO_FASTER, NOT_FASTEST, SAFE_ROUTE, TRAPPED
+
+# Edge state -> (color, linewidth, linestyle) in the 3D view
+EDGE_STYLES = {
+    SAFE_ROUTE: ("blue", 2, "solid"),
+    FIRE_AHEAD: ("red", 1, "dashed"),
+    GO_FASTER: ("yellow", 3, "solid"),
+    TRAPPED: ("black", 1, "dotted"),
+    NOT_FASTEST: ("orange", 1, "dotted"),
+}
+
+# Edge state -> color of its digit (the state code) on the mini UI signs
+SIGN_COLORS = {
+    SAFE_ROUTE: "green",
+    NOT_FASTEST: "orange",
+    GO_FASTER: "yellow",
+    TRAPPED: "black",
+    FIRE_AHEAD: "red",
+}
+
+# A corridor is drawn in the state of whichever direction ranks higher here
+LINE_PRIORITY = np.array([3, 0, 4, 1, 2])  # Indexed by state code
+
+
+class BuildingView:
+    """3D building view plus mini UI whose artists are built once and restyled per frame.
+
+    One scatter holds every node, one Line3DCollection every corridor and
+    one text per directed edge the mini UI, so a frame only pushes new
+    colours, styles and the person's position, and only signs whose state
+    changed are touched. draw() returns the artists for blitting.
+    """
+
+    def __init__(self, ax_3d, ax_ui, core, person_position):
+        pos = core.coords
+        # One line per corridor, drawn from the states of both of its directed edges; one-way
+        # edges (directed graphs) have no backward slot (-1) and are drawn from their own state
+        reverse = core.reverse_edge_ids()
+        self.forward = np.flatnonzero((core.edge_source < core.indices) | (reverse < 0))
+        self.backward = reverse[self.forward]
+        self.one_way = self.backward < 0
+        self.drawn = None  # Edge states on the signs right now
+
+        self.nodes = ax_3d.scatter(*pos.T, color="green", s=200, depthshade=False)
+        self.lines = Line3DCollection([(pos[core.edge_source[k]], pos[core.indices[k]]) for k in self.forward])
+        ax_3d.add_collection3d(self.lines)
+        x, y, z = person_position
+        self.person, = ax_3d.plot([x], [y], [z], "o", color="pink", markersize=16, markeredgecolor="white")
+        # Inside the axes so it is blitted with them
+        self.title = ax_3d.text2D(0.5, 0.98, "", transform=ax_3d.transAxes, ha="center", va="top", fontsize="large")
+        ax_3d.set_xlabel("Column")
+        ax_3d.set_ylabel("Row")
+        ax_3d.set_zlabel("Floor")
+
+        # Mini UI: one sign per directed edge on a fixed grid, each corridor's two directions side by side
+        ax_ui.set_xticks([])
+        ax_ui.set_yticks([])
+        ax_ui.set_xlim(0, 10)
+        ax_ui.set_ylim(0, 10)
+        ax_ui.set_aspect("equal")
+        self.sign_edges = np.column_stack((self.forward, self.backward)).ravel()
+        self.sign_edges = self.sign_edges[self.sign_edges >= 0]
+        n_cols = max(2, 2 * int(np.ceil(np.sqrt(len(self.sign_edges) / 2))))
+        n_rows = max(1, int(np.ceil(len(self.sign_edges) / n_cols)))
+        self.signs = []
+        for idx in range(len(self.sign_edges)):
+            row, col = divmod(idx, n_cols)
+            x = col * (10 / n_cols) + (5 / n_cols)
+            y = 10 - (row * (10 / n_rows) + (5 / n_rows))
+            self.signs.append(ax_ui.text(x, y, "", fontsize=14, ha="center", va="center", fontweight="bold"))
+
+        self.artists = [self.nodes, self.lines, self.person, self.title] + self.signs
+
+    def draw(self, node_colors, edge_states, person_position, tick):
+        """Restyle the existing artists for this frame and return them; edge_states is per directed edge."""
+        self.nodes.set_color(node_colors)
+        forward = edge_states[self.forward]
+        backward = np.where(self.one_way, forward, edge_states[self.backward])
+        lines = np.where(LINE_PRIORITY[forward] >= LINE_PRIORITY[backward], forward, backward)
+        colors, widths, styles = zip(*(EDGE_STYLES[state] for state in lines.tolist()))
+        self.lines.set_color(colors)
+        self.lines.set_linewidth(widths)
+        self.lines.set_linestyle(styles)
+
+        x, y, z = person_position
+        self.person.set_data_3d([x], [y], [z])
+        self.title.set_text(f"Time Step: {tick}")
+
+        signs = edge_states[self.sign_edges]
+        changed = np.arange(len(signs)) if self.drawn is None else np.flatnonzero(signs != self.drawn)
+        for idx in changed.tolist():
+            state = int(signs[idx])
+            self.signs[idx].set_text(str(state))
+            self.signs[idx].set_color(SIGN_COLORS[state])
+        self.drawn = signs
+        return self.artists
+
+
+# Function to color nodes based on fire, exit, warning, and blocked status
+def node_colors(snapshot):
+    return np.select(
+        [snapshot.fire, snapshot.exit, snapshot.blocked, snapshot.warning < snapshot.distance_to_safety],
+        ["red", "blue", "orange", "yellow"], "green")
+
+# Function to open the 3D view and mini UI on a running SimulationClock
+def show(clock):
+    simulation = clock.simulation
+    core = simulation.core
+
+    # Create the figure and subplots
+    fig = plt.figure(figsize=(15, 7))
+    gs = fig.add_gridspec(1, 2, width_ratios=[2, 1])
+    ax_3d = fig.add_subplot(gs[0], projection="3d")
+    ax_ui = fig.add_subplot(gs[1])
+
+    # Node, edge and sign artists are created once and only restyled by update()
+    view = BuildingView(ax_3d, ax_ui, core, clock.latest.person_position)
+
+    def update(frame):
+        snapshot = clock.latest
+        with simulation.metrics.stage("render"):
+            return view.draw(node_colors(snapshot), snapshot.edge_states, snapshot.person_position, snapshot.tick)
+
+    def on_key_press(event):
+        if event.key == " ":
+            clock.paused = not clock.paused  # Toggle pause/play of the model itself
+
+    ani = FuncAnimation(fig, update, interval=simulation.tick_speed, blit=fig.canvas.supports_blit)
+    fig.canvas.mpl_connect("key_press_event", on_key_press)
+    plt.show()
+    return ani
@@ -0,0 +1,382 @@
+import heapq
+from itertools import chain
+
+import numpy as np
+
+from graph_core import BuildingGraph
+
+
+# Directed edge states, one int8 per CSR slot; the codes are also the digits on the signs
+SAFE_ROUTE, NOT_FASTEST, GO_FASTER, TRAPPED, FIRE_AHEAD = range(5)
+EDGE_STATE_NAMES = ("safe route", "not fastest route", "go faster", "trapped", "fire ahead")
+
+
+# Function to build the exit-rooted shortest path tree around the fire
+def shortest_exit_tree(core, fire):
+    """Run one multi-source Dijkstra from every exit over the graph minus fire nodes.
+
+    Returns (distance, next_hop) arrays: distance to the nearest reachable exit
+    (inf if cut off) and the next node on the way there (-1 for none).
+    """
+    # Walk edges backwards so directed graphs route towards the exits
+    adjacency = core.reverse_adjacency
+    burning = fire.tolist()
+
+    distance = [float('inf')] * len(core)
+    next_hop = [-1] * len(core)
+    heap = []
+    for exit_node in np.flatnonzero(core.exit & ~fire).tolist():
+        distance[exit_node] = 0.0
+        heap.append((0.0, exit_node))
+    heapq.heapify(heap)
+
+    done = [False] * len(core)
+    while heap:
+        dist, node = heapq.heappop(heap)
+        if done[node]:
+            continue
+        done[node] = True
+        for neighbor, weight in adjacency[node]:
+            if done[neighbor] or burning[neighbor]:
+                continue
+            new_dist = dist + weight
+            if new_dist < distance[neighbor]:
+                distance[neighbor] = new_dist
+                next_hop[neighbor] = node
+                heapq.heappush(heap, (new_dist, neighbor))
+    return np.array(distance), np.array(next_hop, dtype=np.int64)
+
+# Function to expand a next-hop tree into full node -> exit paths
+def paths_from_tree(distance, next_hop):
+    paths = [None] * len(next_hop)
+    hops = next_hop.tolist()
+    # Closest nodes first so every parent path exists before its children
+    for node in np.argsort(distance, kind="stable").tolist():
+        if distance[node] == float('inf'):
+            break
+        parent = hops[node]
+        if parent >= 0:
+            paths[node] = [node] + (paths[parent] or [parent])
+    return paths
+
+# Function to find safest paths
+def find_safest_paths(G, exit_nodes, fire_nodes):
+    """Shortest fire-free path from every node to its nearest exit, by room name.
+
+    Same contract as the old all_simple_paths search: exits and nodes with no
+    escape map to None, and every non-exit node without a path is blocked.
+    """
+    core = BuildingGraph.from_networkx(G)
+    core.exit = core.mask(node for node in exit_nodes if node in core.index)
+    fire = core.mask(node for node in fire_nodes if node in core.index)
+    paths = paths_from_tree(*shortest_exit_tree(core, fire))
+    safe_paths = {name: core.names_of(path) if path else None for name, path in zip(core.names, paths)}
+    blocked_nodes = {name for name, path in safe_paths.items() if path is None and name not in exit_nodes}
+    return safe_paths, blocked_nodes
+
+
+# Function to hold on to a fire mask, copying it only if someone could still change it
+def _keep(fire):
+    return fire if not fire.flags.writeable else fire.copy()
+
+
+class RouteTree:
+    """Exit-rooted shortest path tree kept up to date as the fire spreads.
+
+    Fire only ever grows, so removing burning nodes can only lengthen routes,
+    and only for nodes whose route ran through a node that just ignited.
+    update() repairs those subtrees and leaves the rest of the tree alone.
+    """
+
+    def __init__(self, core, fire=None):
+        self.core = core
+        self.rebuild(core.fire if fire is None else fire)
+
+    def rebuild(self, fire):
+        self.fire = _keep(fire)
+        self.distance, self.next_hop = shortest_exit_tree(self.core, self.fire)
+        self.children = [set() for _ in range(len(self.core))]
+        for node, parent in enumerate(self.next_hop.tolist()):
+            if parent >= 0:
+                self.children[parent].add(node)
+        self.paths = paths_from_tree(self.distance, self.next_hop)
+        self.blocked = np.isinf(self.distance) & ~self.core.exit
+
+    def update(self, fire):
+        """Take in the current fire mask and return the ids whose route changed."""
+        if fire is self.fire:
+            return np.zeros(0, dtype=np.int64)  # Same published mask, nothing can have changed
+        if (self.fire & ~fire).any():
+            # Fire went out somewhere (e.g. a reset), start over
+            self.rebuild(fire)
+            return np.arange(len(self.core))
+        new_fire = np.flatnonzero(fire & ~self.fire)
+        if not len(new_fire):
+            return new_fire
+        self.fire = _keep(fire)
+        distance = self.distance
+        next_hop = self.next_hop
+
+        # Every node whose route passed through a new fire node has to move
+        affected = set()
+        stack = [node for node in new_fire.tolist() if distance[node] < float('inf')]
+        while stack:
+            node = stack.pop()
+            if node not in affected:
+                affected.add(node)
+                stack.extend(self.children[node])
+
+        # Cut the affected subtrees out of the tree
+        for node in affected:
+            parent = next_hop[node]
+            if parent >= 0 and parent not in affected:
+                self.children[parent].discard(node)
+            self.children[node] = set()
+        cut = np.fromiter(affected, dtype=np.int64, count=len(affected))
+        distance[cut] = float('inf')
+        next_hop[cut] = -1
+
+        # Seed each affected node from its best neighbour outside the cut
+        best = {}
+        heap = []
+        for node in affected:
+            if fire[node]:
+                continue
+            for neighbor, weight in self.core.adjacency[node]:
+                dist = distance[neighbor] + weight
+                if dist < best.get(node, (float('inf'),))[0]:
+                    best[node] = (dist, neighbor)
+            if node in best:
+                heapq.heappush(heap, (best[node][0], node))
+
+        # Dijkstra confined to the affected region
+        done = set()
+        while heap:
+            dist, node = heapq.heappop(heap)
+            if node in done or dist > best[node][0]:
+                continue
+            done.add(node)
+            parent = best[node][1]
+            distance[node] = dist
+            next_hop[node] = parent
+            self.children[parent].add(node)
+            for neighbor, weight in self.core.reverse_adjacency[node]:
+                if neighbor not in affected or neighbor in done or fire[neighbor]:
+                    continue
+                new_dist = dist + weight
+                if new_dist < best.get(neighbor, (float('inf'),))[0]:
+                    best[neighbor] = (new_dist, node)
+                    heapq.heappush(heap, (new_dist, neighbor))
+
+        # Refresh the cached paths of the affected nodes only
+        for node in sorted(affected, key=lambda n: distance[n]):
+            parent = next_hop[node]
+            self.paths[node] = [node] + (self.paths[parent] or [parent]) if parent >= 0 else None
+        self.blocked[cut] = np.isinf(distance[cut]) & ~self.core.exit[cut]
+        return cut
+
+    def path_min(self, values):
+        """Smallest of values along each node's route to its exit, values itself where there is none."""
+        best = np.asarray(values, dtype=np.float64).tolist()
+        hops = self.next_hop.tolist()
+        # Parents sit closer to the exit, so their minimum is final before their children read it
+        for node in np.argsort(self.distance, kind="stable").tolist():
+            if self.distance[node] == float('inf'):
+                break
+            parent = hops[node]
+            if parent >= 0 and best[parent] < best[node]:
+                best[node] = best[parent]
+        return np.array(best)
+
+
+# Function to work out how long each node can be left before escape is cut off
+def latest_safe_departure(core, fire, fire_eta, ticks_per_weight):
+    """Reverse label-setting pass from the exits over fire arrival times.
+
+    Someone at a node at time t can still get out ahead of the fire iff
+    t < latest[node]. Each room closes when the fire reaches it, so
+    latest[u] = min(fire_eta[u], max over v of latest[v] - travel(u, v)).
+    """
+    burning = fire.tolist()
+    closing = fire_eta.tolist()
+    latest = [-float('inf')] * len(core)
+    heap = []
+    for exit_node in np.flatnonzero(core.exit & ~fire).tolist():
+        latest[exit_node] = closing[exit_node]
+        heap.append((-latest[exit_node], exit_node))
+    heapq.heapify(heap)
+
+    # Settle nodes from the latest deadline down, like Dijkstra on max-min labels
+    done = [False] * len(core)
+    while heap:
+        neg_time, node = heapq.heappop(heap)
+        if done[node]:
+            continue
+        done[node] = True
+        for neighbor, weight in core.reverse_adjacency[node]:
+            if done[neighbor] or burning[neighbor]:
+                continue
+            time = min(closing[neighbor], -neg_time - weight * ticks_per_weight)
+            if time > latest[neighbor]:
+                latest[neighbor] = time
+                heapq.heappush(heap, (-time, neighbor))
+    return np.array(latest)
+
+# Function to check a path reaches every room before the fire does
+def stays_ahead_of_fire(core, path, fire_eta, ticks_per_weight):
+    time = 0
+    for i, node in enumerate(path):
+        if i:
+            time += core.weight(path[i - 1], node) * ticks_per_weight
+        if time >= fire_eta[node]:
+            return False
+    return True
+
+# Function to find the earliest arrival at any exit that stays ahead of the fire
+def earliest_arrival_path(core, source, latest, distance, ticks_per_weight):
+    arrival = {source: 0}
+    parent = {source: None}
+    # A* on arrival time, using the fire-free distance to an exit as the bound
+    heap = [(distance[source] * ticks_per_weight, 0, source)]
+    done = set()
+    while heap:
+        _, time, node = heapq.heappop(heap)
+        if node in done:
+            continue
+        done.add(node)
+        if core.exit[node]:
+            path = []
+            while node is not None:
+                path.append(node)
+                node = parent[node]
+            return path[::-1]
+        for neighbor, weight in core.adjacency[node]:
+            if neighbor in done:
+                continue
+            new_time = time + weight * ticks_per_weight
+            # Only step into rooms we can still get out of in time
+            if new_time < latest[neighbor] and new_time < arrival.get(neighbor, float('inf')):
+                arrival[neighbor] = new_time
+                parent[neighbor] = node
+                heapq.heappush(heap, (new_time + distance[neighbor] * ticks_per_weight, new_time, neighbor))
+    return None
+
+# Function to find paths that stay ahead of the fire front
+def find_timed_paths(core, fire, fire_eta, tick_speed, route_tree=None):
+    """Earliest-arrival route from every node that reaches each room before the fire.
+
+    fire_eta holds the tick the fire is expected to reach each node, and travel
+    time per edge follows Crowd.step (weight * ticks per second). Returns
+    (timed_paths, cut_off): paths by node id in the RouteTree.paths layout, and
+    a mask of nodes with no route that outruns the fire.
+    """
+    ticks_per_weight = 1000 / tick_speed
+    if route_tree is None:
+        route_tree = RouteTree(core, fire)
+    latest = latest_safe_departure(core, fire, fire_eta, ticks_per_weight)
+    distance = route_tree.distance.tolist()
+    latest_list = latest.tolist()
+
+    timed_paths = [None] * len(core)
+    cut_off = (latest <= 0) & ~core.exit
+    for node in np.flatnonzero(~cut_off & ~core.exit).tolist():
+        # The shortest route is the earliest arrival whenever it is fast enough
+        path = route_tree.paths[node]
+        if not path or not stays_ahead_of_fire(core, path, fire_eta, ticks_per_weight):
+            path = earliest_arrival_path(core, node, latest_list, distance, ticks_per_weight)
+        timed_paths[node] = path
+    return timed_paths, cut_off
+
+
+# Function to find the directed edges that lie on the given paths
+def path_edges(core, paths):
+    """(on_route, edges, owners): mask of edges on any path, then every path edge with the node whose path it is.
+
+    paths are node id lists starting at their node, as in RouteTree.paths.
+    """
+    paths = [path for path in paths if path and len(path) > 1]
+    on_route = np.zeros(len(core.indices), dtype=bool)
+    if not paths:
+        return on_route, np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    lengths = np.fromiter(map(len, paths), dtype=np.int64, count=len(paths))
+    flat = np.fromiter(chain.from_iterable(paths), dtype=np.int64, count=int(lengths.sum()))
+    # Every position except the last of each path starts an edge
+    starts = np.cumsum(lengths) - lengths
+    is_edge = np.ones(len(flat), dtype=bool)
+    is_edge[starts + lengths - 1] = False
+    first = np.flatnonzero(is_edge)
+    edges = core.edge_ids(flat[first], flat[first + 1])
+    on_route[edges] = True
+    owners = np.repeat(flat[starts], lengths - 1)
+    return on_route, edges, owners
+
+
+class EdgeStates:
+    """Directed state of every edge as an int8 per CSR slot, updated incrementally.
+
+    An edge leading into fire is FIRE_AHEAD, an edge touching a room with
+    no way out is TRAPPED, an edge on someone's safe path is SAFE_ROUTE
+    (GO_FASTER if the path belongs to a room the fire reaches before its
+    occupants get out, and it leads into another such room) and everything
+    else NOT_FASTEST. update() only recomputes edges with an endpoint whose
+    fire, blocked or yellow flag changed, or whose place on the safe paths
+    changed, and publishes a new read-only state array when anything did.
+    Per edge it counts the paths running along it and how many of those
+    belong to yellow rooms, so a replan only re-expands the paths that
+    actually changed.
+    """
+
+    def __init__(self, core):
+        self.core = core
+        self.state = np.full(len(core.indices), NOT_FASTEST, dtype=np.int8)
+        self.state.setflags(write=False)
+        self.node_flags = np.zeros(len(core), dtype=np.int8)  # fire | blocked << 1 | yellow << 2 last update
+        self.routes = np.zeros(len(core.indices), dtype=np.int64)  # Paths running along each edge
+        self.yellow_routes = np.zeros(len(core.indices), dtype=np.int64)  # Of those, paths of yellow rooms
+        self.paths = [None] * len(core)
+
+    def update(self, fire, blocked, yellow, paths=None):
+        """Bring the states up to date; paths only when they were replanned. Returns the ids of edges that changed."""
+        core = self.core
+        flags = fire.astype(np.int8) | (blocked.astype(np.int8) << 1) | (yellow.astype(np.int8) << 2)
+        moved = flags != self.node_flags
+        dirty = moved[core.edge_source] | moved[core.indices]
+        was_yellow = (self.node_flags & 4) != 0
+        self.node_flags = flags
+
+        # Re-expand the paths that were replanned or whose room turned yellow or back
+        redo = set(np.flatnonzero(was_yellow != yellow).tolist())
+        if paths is not None:
+            # Unchanged routes are mostly the very same list objects, so the comparison is cheap
+            redo.update(node for node, (path, before) in enumerate(zip(paths, self.paths))
+                        if path is not before and path != before)
+        if redo:
+            redo = list(redo)
+            _, edges, owners = path_edges(core, [self.paths[node] for node in redo])
+            np.subtract.at(self.routes, edges, 1)
+            np.subtract.at(self.yellow_routes, edges, was_yellow[owners])
+            dirty[edges] = True
+            if paths is not None:
+                self.paths = paths
+            _, edges, owners = path_edges(core, [self.paths[node] for node in redo])
+            np.add.at(self.routes, edges, 1)
+            np.add.at(self.yellow_routes, edges, yellow[owners])
+            dirty[edges] = True
+        elif paths is not None:
+            self.paths = paths
+
+        edges = np.flatnonzero(dirty)
+        if not len(edges):
+            return edges
+        source, target = core.edge_source[edges], core.indices[edges]
+        new = np.select(
+            [(self.yellow_routes[edges] > 0) & yellow[target], fire[target], self.routes[edges] > 0,
+             blocked[source] | blocked[target]],
+            [GO_FASTER, FIRE_AHEAD, SAFE_ROUTE, TRAPPED], NOT_FASTEST).astype(np.int8)
+        changed = edges[new != self.state[edges]]
+        if len(changed):
+            state = self.state.copy()
+            state[edges] = new
+            state.setflags(write=False)
+            self.state = state  # Readers holding the old array keep a consistent view
+        return changed
@@ -0,0 +1,132 @@
+import threading
+import time
+
+import numpy as np
+
+from sensors import FLAG_READ_ERROR
+
+LOG_MAGIC = b"SENSLOG1"  # First bytes of every log, bump the digit if LOG_DTYPE changes
+FLUSH_EVERY = 256  # Readings buffered before they are written out
+FLUSH_SECONDS = 1.0  # Longest a reading waits in the buffer, so an alarm is on disk within a second
+
+# One recorded reading, packed little-endian, 42 bytes
+LOG_DTYPE = np.dtype([
+    ("monotonic", "<f8"),  # Seconds since recording started, from time.monotonic()
+    ("timestamp", "<f8"),  # Wall-clock seconds the reading was taken (the board's clock, or when it arrived)
+    ("sensor", "S16"),  # Sensor id, ASCII padded with NULs
+    ("temperature", "<f4"),  # °C
+    ("humidity", "<f4"),  # %
+    ("flags", "<u2"),  # sensors.FLAG_* bits
+])
+
+
+# Function to load a recorded log as one structured array
+def read_sensor_log(path):
+    """LOG_DTYPE array of every complete reading in the log; a half-written last reading is dropped."""
+    with open(path, "rb") as f:
+        if f.read(len(LOG_MAGIC)) != LOG_MAGIC:
+            raise ValueError(f"{path} is not a sensor log")
+        body = f.read()
+    return np.frombuffer(body, dtype=LOG_DTYPE, count=len(body) // LOG_DTYPE.itemsize)
+
+
+class SensorRecorder:
+    """Writes every reading passing through to a SensorFeed into an append-only log.
+
+    Has the feed's put() and put_records(), so it drops in wherever the feed
+    was handed to a poller or server. Readings are passed on straight away
+    and written out in batches of FLUSH_EVERY, or after FLUSH_SECONDS.
+    """
+
+    def __init__(self, path, feed):
+        self.path = path
+        self.feed = feed
+        self.recorded = 0
+        self._file = open(path, "wb")
+        self._file.write(LOG_MAGIC)
+        self._lock = threading.Lock()  # Poller and server threads record concurrently
+        self._buffer = []  # LOG_DTYPE arrays not written yet
+        self._buffered = 0
+        self._started = time.monotonic()
+        self._flushed = self._started
+
+    def put(self, reading):
+        self.feed.put(reading)
+        row = np.array([(time.monotonic() - self._started, reading.timestamp, reading.sensor_id.encode(),
+                         reading.temperature, reading.humidity, 0)], dtype=LOG_DTYPE)
+        self._append(row)
+
+    def put_records(self, records, received_at):
+        self.feed.put_records(records, received_at)
+        rows = np.empty(len(records), dtype=LOG_DTYPE)
+        rows["monotonic"] = time.monotonic() - self._started
+        rows["timestamp"] = np.where(records["timestamp"] > 0, records["timestamp"], received_at)
+        rows["sensor"] = records["sensor"]
+        rows["temperature"] = records["temperature"]
+        rows["humidity"] = records["humidity"]
+        rows["flags"] = records["flags"]
+        self._append(rows)
+
+    def _append(self, rows):
+        with self._lock:
+            self._buffer.append(rows)
+            self._buffered += len(rows)
+            if self._buffered >= FLUSH_EVERY or time.monotonic() - self._flushed >= FLUSH_SECONDS:
+                self._flush()
+
+    def _flush(self):
+        if self._buffer:
+            self._file.write(np.concatenate(self._buffer).tobytes())
+            self._file.flush()
+            self.recorded += self._buffered
+        self._buffer = []
+        self._buffered = 0
+        self._flushed = time.monotonic()
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def close(self):
+        with self._lock:
+            self._flush()
+            self._file.close()
+
+
+class SensorReplay:
+    """Plays a recorded log back into a SensorFeed, paced by the simulation's ticks.
+
+    Takes the feed's place as Simulation(sensors=...): every
+    drain_fire_mask() first releases the readings recorded during the next
+    tick's worth of time. The replay therefore runs at whatever speed the
+    SimulationClock runs, 1x, 100x or unthrottled, and a given log always
+    produces the same ticks. Time starts at the first recorded reading.
+    """
+
+    def __init__(self, log, feed, tick_speed):
+        self.log = read_sensor_log(log) if isinstance(log, str) else log
+        self.log = self.log[self.log["flags"] & FLAG_READ_ERROR == 0]
+        self.feed = feed
+        self.tick_seconds = tick_speed / 1000
+        self.position = 0  # Next reading to release
+        self.elapsed = self.log["monotonic"][0] if len(self.log) else 0.0
+
+    @property
+    def done(self):
+        return self.position >= len(self.log)
+
+    @property
+    def lag(self):
+        return np.zeros(0)  # The readings were taken long ago, their ingestion lag means nothing here
+
+    def release(self):
+        """Hand the feed every reading recorded up to the current replay time."""
+        end = np.searchsorted(self.log["monotonic"], self.elapsed, side="right")
+        if end > self.position:
+            self.feed.put_records(self.log[self.position:end], time.time())  # Zero-copy slice of the log
+            self.position = end
+
+    def drain_fire_mask(self):
+        self.release()
+        self.elapsed += self.tick_seconds
+        return self.feed.drain_fire_mask()
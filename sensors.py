@@ -0,0 +1,516 @@
+import asyncio
+import random
+import re
+import socket
+import threading
+import time
+from collections import deque, namedtuple
+
+import aiohttp
+import numpy as np
+from aiohttp import web
+
+POLL_INTERVAL = 2.0  # Seconds between polls of one board, the firmware reads its DHT11 every 2 s
+POLL_TIMEOUT = 1.5  # Seconds before a board counts as not answering
+POLL_JITTER = 0.2  # +-20% on every wait so boards don't get polled in lockstep
+MAX_BACKOFF = 60.0  # Longest wait between retries of a board that keeps failing
+MAX_BACKOFF_EXPONENT = 16  # Doublings of the interval counted towards the backoff, far past MAX_BACKOFF
+MAX_CONNECTIONS = 100  # Pooled keep-alive connections shared by all boards
+FIRE_THRESHOLD = 27.5  # Default °C above which a sensor reports fire
+PUSH_PORT = 9750  # UDP port the boards push readings to (PUSH_PORT in DHT11_code.ino)
+RECEIVE_BUFFER = 4 * 1024 * 1024  # Bytes of UDP backlog the kernel holds while the loop is busy
+HISTORY_SIZE = 64  # Readings kept per sensor, about two minutes at one reading every 2 s
+SMOOTHING_WINDOW = 3  # Newest readings averaged for the smoothed-level and z-score tests; a raw reading over threshold trips alone
+RATE_WINDOW = 10  # Newest readings the rate of rise is fitted over, long enough that one-degree steps don't count
+RATE_OF_RISE = 8.0  # °C per minute that counts as fire, about what rate-of-rise heat detectors use
+Z_SCORE = 4.0  # Standard deviations above a sensor's own baseline that count as fire
+MIN_BASELINE = 8  # Older readings needed before a sensor's baseline is trusted
+MIN_BASELINE_STD = 1.0  # °C floor on the baseline spread, a DHT11 reads whole degrees so a quiet room has none
+
+Reading = namedtuple("Reading", "sensor_id timestamp temperature humidity")
+
+# Binary reading pushed by DHT11_code.ino with BINARY_READINGS on: packed little-endian, 28 bytes,
+# any number of them back to back in one datagram or POST body
+READING_DTYPE = np.dtype([
+    ("magic", "<u2"),  # READING_MAGIC, never the first bytes of a text reading
+    ("flags", "<u2"),  # FLAG_* bits
+    ("sensor", "S8"),  # Sensor id, ASCII padded with NULs
+    ("timestamp", "<f8"),  # Seconds since the epoch, 0 if the board's clock isn't synced yet
+    ("temperature", "<f4"),  # °C
+    ("humidity", "<f4"),  # %
+])
+READING_MAGIC = 0xF17E
+FLAG_ALARM = 1  # The board's own threshold tripped
+FLAG_READ_ERROR = 2  # The DHT11 read failed, temperature and humidity are meaningless
+_MAGIC = np.array(READING_MAGIC, dtype="<u2").tobytes()
+
+_SENSOR = re.compile(rb"Sensor:\s*(\S+)")
+_TEMPERATURE = re.compile(rb"Temperature:\s*(-?\d+(?:\.\d+)?)")
+_HUMIDITY = re.compile(rb"Humidity:\s*(-?\d+(?:\.\d+)?)")
+
+
+# Function to read temperature and humidity out of the ESP32 /data text
+def parse_text_reading(body):
+    """Parse b"Temperature: 25.00°C\\nHumidity: 40.00%" into (temperature, humidity).
+
+    Works on the raw bytes, so it doesn't care how the degree sign was
+    encoded. Humidity is nan if the board left it out.
+    """
+    temperature = _TEMPERATURE.search(body)
+    if temperature is None:
+        raise ValueError(f"No temperature in sensor response {body[:40]!r}")
+    humidity = _HUMIDITY.search(body)
+    return float(temperature.group(1)), float(humidity.group(1)) if humidity else float('nan')
+
+# Function to turn one pushed message into a Reading
+def parse_pushed_reading(body, sender):
+    """Same text as /data with a "Sensor: <id>" line in front; without one the sender's address is the id."""
+    sensor = _SENSOR.search(body)
+    temperature, humidity = parse_text_reading(body)
+    return Reading(sensor.group(1).decode() if sensor else sender, time.time(), temperature, humidity)
+
+
+# Function to view a buffer of binary readings as a structured array
+def parse_binary_readings(body):
+    """Zero-copy READING_DTYPE view of body; raises ValueError unless it is whole, valid records."""
+    if len(body) % READING_DTYPE.itemsize:
+        raise ValueError(f"{len(body)} bytes is not a whole number of {READING_DTYPE.itemsize}-byte readings")
+    records = np.frombuffer(body, dtype=READING_DTYPE)
+    if not len(records) or (records["magic"] != READING_MAGIC).any():
+        raise ValueError("Bad magic in binary sensor readings")
+    return records
+
+# Function to tell the binary format apart from the text one
+def is_binary_reading(body):
+    return body[:2] == _MAGIC
+
+
+class _BackgroundLoop:
+    """Runs the subclass's async run() on its own event loop in a daemon thread until stop()."""
+
+    _loop = None
+    _thread = None
+    _stopped = None
+
+    def start(self):
+        self._loop = asyncio.new_event_loop()
+        self._stopped = asyncio.Event()
+        self._thread = threading.Thread(target=self._loop.run_until_complete, args=(self.run(),), daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._loop.call_soon_threadsafe(self._stopped.set)
+        self._thread.join()
+        self._loop.close()
+        self._thread = None
+
+
+class SensorPoller(_BackgroundLoop):
+    """Polls many ESP32 /data endpoints concurrently from one background asyncio loop.
+
+    All boards share one aiohttp session, so connections are pooled and kept
+    alive between polls. Each board has its own timeout and jittered poll
+    interval, and a board that fails backs off exponentially and keeps being
+    retried instead of ending ingestion. on_reading(Reading) runs on the
+    poller's thread and must not block.
+    """
+
+    def __init__(self, endpoints, on_reading, interval=POLL_INTERVAL, timeout=POLL_TIMEOUT,
+                 jitter=POLL_JITTER, max_backoff=MAX_BACKOFF, max_connections=MAX_CONNECTIONS):
+        self.endpoints = dict(endpoints)  # Sensor id -> /data URL
+        self.on_reading = on_reading
+        self.interval = interval
+        self.timeout = timeout
+        self.jitter = jitter
+        self.max_backoff = max_backoff
+        self.max_connections = max_connections
+        self.failures = {sensor_id: 0 for sensor_id in self.endpoints}  # Consecutive failed polls
+
+    async def run(self):
+        connector = aiohttp.TCPConnector(limit=self.max_connections)
+        async with aiohttp.ClientSession(connector=connector) as session:
+            tasks = [asyncio.create_task(self._poll(session, sensor_id, url))
+                     for sensor_id, url in self.endpoints.items()]
+            await self._stopped.wait()
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _wait(self, seconds):
+        return asyncio.sleep(seconds * random.uniform(1 - self.jitter, 1 + self.jitter))
+
+    async def _poll(self, session, sensor_id, url):
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        # Spread the first round of polls over one interval
+        await asyncio.sleep(random.uniform(0, self.interval))
+        while True:
+            try:
+                async with session.get(url, timeout=timeout) as response:
+                    response.raise_for_status()
+                    body = await response.read()
+                temperature, humidity = parse_text_reading(body)
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                await self._back_off(sensor_id, f"Sensor {sensor_id} not answering: {e!r}")
+                continue
+            except Exception as e:
+                # Anything unexpected is logged every time and retried like a failed poll
+                print(f"Sensor {sensor_id} poll failed unexpectedly: {e!r}")
+                await self._back_off(sensor_id, None)
+                continue
+
+            try:
+                if self.failures[sensor_id]:
+                    print(f"Sensor {sensor_id} back after {self.failures[sensor_id]} failed polls")
+                    self.failures[sensor_id] = 0
+                self.on_reading(Reading(sensor_id, time.time(), temperature, humidity))
+            except Exception as e:
+                # A bug downstream must not end this board's polling for good
+                print(f"Sensor {sensor_id} reading dropped: {e!r}")
+            await self._wait(self.interval)
+
+    async def _back_off(self, sensor_id, message):
+        self.failures[sensor_id] += 1
+        if self.failures[sensor_id] == 1 and message:
+            print(message)
+        # The exponent is capped, 2 ** 1024 would overflow a float after ~17 h of outage
+        exponent = min(self.failures[sensor_id], MAX_BACKOFF_EXPONENT)
+        await self._wait(min(self.max_backoff, self.interval * 2 ** exponent))
+
+
+class _PushProtocol(asyncio.DatagramProtocol):
+    def __init__(self, server):
+        self.server = server
+
+    def datagram_received(self, data, addr):
+        self.server.receive(data, addr[0])
+
+
+class SensorServer(_BackgroundLoop):
+    """Accepts readings pushed by the boards, one per UDP datagram or HTTP POST /readings.
+
+    Each message is parsed and handed on straight from the receive callback,
+    so an alarm reaches the feed as soon as it lands. Text messages become
+    on_reading(Reading); binary ones go to on_records(records, received_at)
+    as one READING_DTYPE array, or one Reading each if on_records is None.
+    Malformed messages are counted in rejected rather than logged, since a
+    misbehaving board can send thousands per second. start() returns once
+    the sockets are bound; udp_address holds the actual (host, port).
+    """
+
+    def __init__(self, on_reading, host="0.0.0.0", udp_port=PUSH_PORT, http_port=None, on_records=None):
+        self.on_reading = on_reading
+        self.on_records = on_records
+        self.host = host
+        self.udp_port = udp_port
+        self.http_port = http_port
+        self.udp_address = None
+        self.received = 0
+        self.rejected = 0
+        self._ready = threading.Event()
+
+    def start(self):
+        super().start()
+        self._ready.wait()
+        if self.udp_address is None:
+            self._thread.join()
+            raise OSError(f"Could not bind sensor server on {self.host}:{self.udp_port}")
+
+    def receive(self, body, sender):
+        try:
+            if is_binary_reading(body):
+                self._receive_records(parse_binary_readings(body))
+                return
+            reading = parse_pushed_reading(body, sender)
+        except ValueError:
+            self.rejected += 1
+            return
+        self.received += 1
+        self.on_reading(reading)
+
+    def _receive_records(self, records):
+        self.received += len(records)
+        if self.on_records is not None:
+            self.on_records(records, time.time())
+            return
+        for record in records:
+            self.on_reading(Reading(record["sensor"].decode(), float(record["timestamp"]) or time.time(),
+                                    float(record["temperature"]), float(record["humidity"])))
+
+    async def _handle_post(self, request):
+        self.receive(await request.read(), request.remote)
+        return web.Response(status=204)
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        transport = runner = None
+        try:
+            transport, _ = await loop.create_datagram_endpoint(
+                lambda: _PushProtocol(self), local_addr=(self.host, self.udp_port))
+            if self.http_port is not None:
+                app = web.Application()
+                app.router.add_post("/readings", self._handle_post)
+                runner = web.AppRunner(app, access_log=None)
+                await runner.setup()
+                await web.TCPSite(runner, self.host, self.http_port).start()
+        except OSError as e:
+            print(f"Sensor server failed to start: {e!r}")
+            if transport is not None:
+                transport.close()
+            self._ready.set()
+            return
+        # A bigger kernel buffer rides out bursts, e.g. every board alarming at once
+        transport.get_extra_info("socket").setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, RECEIVE_BUFFER)
+        self.udp_address = transport.get_extra_info("sockname")
+        self._ready.set()
+        try:
+            await self._stopped.wait()
+        finally:
+            transport.close()
+            if runner is not None:
+                await runner.cleanup()
+
+
+class SensorRegistry:
+    """Which rooms each sensor watches, and the temperature at which it reports fire.
+
+    Rooms are kept as a CSR list (room_ptr, room_ids) over sensor rows so a
+    whole batch of readings turns into one room mask without Python loops.
+    """
+
+    def __init__(self, core):
+        self.core = core
+        self.index = {}  # Sensor id -> row
+        self.thresholds = np.zeros(0)
+        self.room_ptr = np.zeros(1, dtype=np.int64)
+        self.room_ids = np.zeros(0, dtype=np.int64)
+
+    @classmethod
+    def from_table(cls, core, sensors):
+        """Registry for a building.SENSORS-style table of id -> (url, rooms, threshold)."""
+        registry = cls(core)
+        for sensor_id, (_, rooms, threshold) in sensors.items():
+            registry.register(sensor_id, rooms, threshold)
+        return registry
+
+    def __len__(self):
+        return len(self.index)
+
+    def register(self, sensor_id, rooms, threshold=FIRE_THRESHOLD):
+        if sensor_id in self.index:
+            raise ValueError(f"Sensor {sensor_id} is already registered")
+        ids = self.core.ids(rooms)
+        self.index[sensor_id] = len(self.index)
+        self.thresholds = np.append(self.thresholds, threshold)
+        self.room_ids = np.concatenate((self.room_ids, ids))
+        self.room_ptr = np.append(self.room_ptr, len(self.room_ids))
+
+    def rows(self, sensor_ids):
+        """Registry rows of sensor_ids, -1 for sensors nobody registered."""
+        return np.fromiter((self.index.get(sensor_id, -1) for sensor_id in sensor_ids), dtype=np.int64)
+
+    def rooms_of(self, rows):
+        """Node ids watched by any of the given sensor rows."""
+        start = self.room_ptr[rows]
+        count = self.room_ptr[rows + 1] - start
+        return self.room_ids[np.repeat(start - (np.cumsum(count) - count), count) + np.arange(count.sum())]
+
+    def rooms_mask(self, rows):
+        """Mask of the rooms watched by any of the given sensor rows."""
+        mask = np.zeros(len(self.core), dtype=bool)
+        mask[self.rooms_of(rows)] = True
+        return mask
+
+
+class SensorHistory:
+    """Fixed-size ring buffers of timestamped readings, one row per registry row.
+
+    Memory stays at capacity readings per sensor no matter how long the
+    system runs; the oldest reading is overwritten first.
+    """
+
+    def __init__(self, sensors=0, capacity=HISTORY_SIZE):
+        self.capacity = capacity
+        self.times = np.full((sensors, capacity), np.nan)
+        self.temperature = np.full((sensors, capacity), np.nan)
+        self.humidity = np.full((sensors, capacity), np.nan)
+        self.head = np.zeros(sensors, dtype=np.int64)  # Slot the next reading goes into
+        self.count = np.zeros(sensors, dtype=np.int64)  # Readings held, at most capacity
+
+    def __len__(self):
+        return len(self.head)
+
+    def resize(self, sensors):
+        """Add empty rows for sensors registered since the buffers were made."""
+        extra = sensors - len(self)
+        if extra <= 0:
+            return
+        blank = np.full((extra, self.capacity), np.nan)
+        self.times = np.vstack((self.times, blank))
+        self.temperature = np.vstack((self.temperature, blank))
+        self.humidity = np.vstack((self.humidity, blank))
+        self.head = np.concatenate((self.head, np.zeros(extra, dtype=np.int64)))
+        self.count = np.concatenate((self.count, np.zeros(extra, dtype=np.int64)))
+
+    def append(self, rows, times, temperatures, humidities):
+        """Write a batch of readings; several for one sensor land in arrival order."""
+        rows = np.asarray(rows, dtype=np.int64)
+        order = np.argsort(rows, kind="stable")
+        rows = rows[order]
+        added = np.bincount(rows, minlength=len(self))
+        # Position of each reading among its sensor's readings in this batch
+        rank = np.arange(len(rows)) - np.searchsorted(rows, rows)
+        keep = rank >= added[rows] - self.capacity  # A sensor can't hold more than capacity
+        rows, rank, order = rows[keep], rank[keep], order[keep]
+        slots = (self.head[rows] + rank) % self.capacity
+        self.times[rows, slots] = np.asarray(times, dtype=np.float64)[order]
+        self.temperature[rows, slots] = np.asarray(temperatures, dtype=np.float64)[order]
+        self.humidity[rows, slots] = np.asarray(humidities, dtype=np.float64)[order]
+        self.head = (self.head + added) % self.capacity
+        self.count = np.minimum(self.count + added, self.capacity)
+
+    def window(self, values, size, skip=0):
+        """(sensors, size) view of values newest first, skipping the newest skip; nan where empty."""
+        back = skip + np.arange(size)
+        slots = (self.head[:, None] - 1 - back) % self.capacity
+        window = values[np.arange(len(self))[:, None], slots]
+        window[back >= self.count[:, None]] = np.nan
+        return window
+
+
+# Function to average each row over the values that are there
+def _row_mean(window):
+    present = ~np.isnan(window)
+    count = present.sum(axis=1)
+    return np.where(present, window, 0).sum(axis=1) / count, present, count
+
+# Function to compute the rolling detector signals for every sensor at once
+def rolling_signals(history, window=SMOOTHING_WINDOW, rate_window=RATE_WINDOW):
+    """(smoothed °C, rate of rise in °C/min, z-score against baseline) per sensor, nan where unknown.
+
+    The smoothed level is the mean of the newest window readings, the rate
+    a least-squares slope through the newest rate_window, and the baseline
+    everything in the buffer older than the smoothing window.
+    """
+    recent = history.window(history.temperature, window)
+    baseline = history.window(history.temperature, history.capacity - window, skip=window)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        smoothed, _, _ = _row_mean(recent)
+
+        temperature = history.window(history.temperature, rate_window)
+        times = history.window(history.times, rate_window)
+        mean_t, present, count = _row_mean(times)
+        mean_temperature, _, _ = _row_mean(temperature)
+        dt = np.where(present, times - mean_t[:, None], 0)
+        slope = (dt * np.where(present, temperature - mean_temperature[:, None], 0)).sum(axis=1) / (dt ** 2).sum(axis=1)
+        rate = np.where(count >= 3, slope * 60, np.nan)
+
+        mean, present, baseline_count = _row_mean(baseline)
+        spread = np.sqrt(np.where(present, (baseline - mean[:, None]) ** 2, 0).sum(axis=1) / baseline_count)
+        z = (smoothed - mean) / np.maximum(spread, MIN_BASELINE_STD)
+        z[baseline_count < MIN_BASELINE] = np.nan
+    return smoothed, rate, z
+
+# Function to decide which sensors report fire from their histories
+def detect_fire(history, thresholds, window=SMOOTHING_WINDOW, rate_of_rise=RATE_OF_RISE, z_score=Z_SCORE):
+    """Sensors whose newest reading is at or over threshold, or smoothed level is, or rising fast, or far above baseline.
+
+    The newest raw reading trips on its own, so a board pushing the moment it
+    crosses its threshold trips the room on the next tick instead of once the
+    moving average has caught up; smoothing only steadies the other tests.
+    """
+    smoothed, rate, z = rolling_signals(history, window)
+    newest = history.window(history.temperature, 1)[:, 0]
+    with np.errstate(invalid="ignore"):
+        over = newest >= thresholds
+    return over | (smoothed > thresholds) | (rate > rate_of_rise) | (z > z_score)  # nan never trips
+
+
+class SensorFeed:
+    """Inbox between sensor threads and the simulation.
+
+    Readings can be put() from any thread at any time, and whole binary
+    batches put_records() without unpacking them (any structured array with
+    READING_DTYPE's sensor, flags, timestamp, temperature and humidity
+    fields). The simulation takes everything that arrived since its last
+    tick with one drain_fire_mask() call, which records it in the sensors'
+    histories, runs the detectors over all sensors and applies the result
+    as a single fire update.
+    """
+
+    def __init__(self, registry, history_size=HISTORY_SIZE):
+        self.registry = registry
+        self.history = SensorHistory(len(registry), history_size)
+        self.pending = deque()  # append/popleft are thread-safe
+        self.pending_records = deque()  # (READING_DTYPE array, received_at) batches
+        self.tripped = np.zeros(0, dtype=bool)  # Detector result per sensor row as of the last reading
+        self.lag = np.zeros(0)  # Seconds from taken to drained, per reading of the last drain
+        self.alarm = np.zeros(0, dtype=bool)  # FLAG_ALARM of each sensor row's newest reading
+
+    def put(self, reading):
+        self.pending.append(reading)
+
+    def put_records(self, records, received_at):
+        self.pending_records.append((records, received_at))
+
+    def drain(self):
+        return [self.pending.popleft() for _ in range(len(self.pending))]
+
+    def drain_records(self):
+        return [self.pending_records.popleft() for _ in range(len(self.pending_records))]
+
+    def _columns(self, readings, batches):
+        """(rows, times, temperatures, humidities, alarms) of everything drained, binary batches decoded in bulk.
+
+        alarms is the board's own FLAG_ALARM bit, always False for text readings.
+        """
+        columns = []
+        if readings:
+            sensor_ids, times, temperatures, humidities = zip(*readings)
+            columns.append((self.registry.rows(sensor_ids), np.asarray(times, dtype=np.float64),
+                            np.asarray(temperatures, dtype=np.float64), np.asarray(humidities, dtype=np.float64),
+                            np.zeros(len(readings), dtype=bool)))
+        if batches:
+            # Field by field, so wire readings and recorded logs (sensor_log.LOG_DTYPE) mix
+            field = lambda name: np.concatenate([records[name] for records, _ in batches])
+            received = np.repeat([received_at for _, received_at in batches], [len(records) for records, _ in batches])
+            # Only the few distinct ids in a batch are decoded and looked up
+            names, inverse = np.unique(field("sensor"), return_inverse=True)
+            rows = self.registry.rows(name.decode() for name in names)[inverse]
+            flags = field("flags")
+            rows[flags & FLAG_READ_ERROR != 0] = -1
+            timestamps = field("timestamp")
+            times = np.where(timestamps > 0, timestamps, received)
+            columns.append((rows, times, field("temperature").astype(np.float64),
+                            field("humidity").astype(np.float64), flags & FLAG_ALARM != 0))
+        rows, times, temperatures, humidities, alarms = [np.concatenate(column) for column in zip(*columns)]
+        order = np.argsort(times, kind="stable")  # Text and binary readings interleaved as they were taken
+        return rows[order], times[order], temperatures[order], humidities[order], alarms[order]
+
+    def record(self, readings, batches=()):
+        """Append readings and binary batches from registered sensors to the history and rerun the detectors.
+
+        A sensor whose board flags its newest reading with FLAG_ALARM trips
+        whatever the detectors say.
+        """
+        self.lag = np.zeros(0)
+        if not readings and not batches and len(self.tripped) == len(self.registry):
+            return  # Histories only change with new readings
+        self.history.resize(len(self.registry))
+        self.alarm = np.concatenate((self.alarm, np.zeros(len(self.registry) - len(self.alarm), dtype=bool)))
+        if readings or batches:
+            rows, times, temperatures, humidities, alarms = self._columns(readings, batches)
+            known = rows >= 0
+            rows, times = rows[known], times[known]
+            self.history.append(rows, times, temperatures[known], humidities[known])
+            self.lag = time.time() - times
+            # Each board's alarm bit as of its newest reading
+            _, newest = np.unique(rows[::-1], return_index=True)
+            newest = len(rows) - 1 - newest
+            self.alarm[rows[newest]] = alarms[known][newest]
+        self.tripped = detect_fire(self.history, self.registry.thresholds) | self.alarm
+
+    def drain_fire_mask(self):
+        self.record(self.drain(), self.drain_records())
+        return self.registry.rooms_mask(np.flatnonzero(self.tripped))
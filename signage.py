@@ -0,0 +1,220 @@
+import socket
+import threading
+
+import numpy as np
+
+SIGN_BITS = 3  # Bits per sign, enough for the five edge state codes
+SIGN_BAUD = 9600  # Serial speed of the sign controller, about 960 bytes a second with 8N1
+KEYFRAME_EVERY = 20  # Published ticks between full frames, so a controller that missed a message catches up
+MAX_SIGNS = 1 << 13  # A delta entry holds the sign number in 13 bits and its state in 3
+
+# Message framing: SYNC, kind, sequence, payload length (uint16 LE), payload, XOR of everything after SYNC
+SYNC = 0xA5
+FULL_FRAME = ord("F")  # Payload: sign count (uint16 LE), then every sign's state packed SIGN_BITS wide
+DELTA = ord("D")  # Payload: one uint16 LE per changed sign, sign << 3 | state
+HEADER_SIZE = 5
+
+
+# Function to pack sign states SIGN_BITS wide, first sign in the high bits of the first byte
+def pack_states(states):
+    states = np.asarray(states, dtype=np.uint8)
+    bits = (states[:, None] >> np.arange(SIGN_BITS - 1, -1, -1, dtype=np.uint8)) & 1
+    return np.packbits(bits.ravel()).tobytes()
+
+# Function to unpack count sign states from pack_states() bytes
+def unpack_states(data, count):
+    bits = np.unpackbits(np.frombuffer(data, dtype=np.uint8), count=count * SIGN_BITS).reshape(count, SIGN_BITS)
+    return (bits << np.arange(SIGN_BITS - 1, -1, -1, dtype=np.uint8)).sum(axis=1).astype(np.int8)
+
+# Function to wrap a payload in the framing the sign controller expects
+def encode_message(kind, sequence, payload):
+    body = bytes([kind, sequence & 0xFF]) + len(payload).to_bytes(2, "little") + payload
+    checksum = int(np.bitwise_xor.reduce(np.frombuffer(body, dtype=np.uint8)))
+    return bytes([SYNC]) + body + bytes([checksum])
+
+# Function to encode every sign's state as one full frame
+def encode_full(states, sequence):
+    return encode_message(FULL_FRAME, sequence, len(states).to_bytes(2, "little") + pack_states(states))
+
+# Function to encode only the given signs' states
+def encode_delta(signs, states, sequence):
+    entries = (np.asarray(signs, dtype=np.uint16) << SIGN_BITS) | np.asarray(states, dtype=np.uint16)
+    return encode_message(DELTA, sequence, entries.astype("<u2").tobytes())
+
+
+class SignageDecoder:
+    """Rebuilds the sign states from the byte stream, the way a sign controller does.
+
+    Bytes can arrive in any chunks. A bad checksum drops one byte and
+    hunts for the next SYNC. After a gap in the sequence numbers deltas are
+    ignored until the next full frame, so the signs are never left showing
+    a mix of old and new states.
+    """
+
+    def __init__(self):
+        self.states = None
+        self.sequence = None
+        self.in_sync = False
+        self.errors = 0  # Corrupt messages skipped
+        self.buffer = bytearray()
+
+    def feed(self, data):
+        self.buffer += data
+        while True:
+            start = self.buffer.find(SYNC)
+            if start < 0:
+                self.buffer.clear()
+                return
+            del self.buffer[:start]
+            if len(self.buffer) < HEADER_SIZE:
+                return
+            size = HEADER_SIZE + int.from_bytes(self.buffer[3:5], "little") + 1
+            if len(self.buffer) < size:
+                return
+            message = bytes(self.buffer[:size])
+            if int(np.bitwise_xor.reduce(np.frombuffer(message[1:-1], dtype=np.uint8))) != message[-1]:
+                self.errors += 1
+                del self.buffer[:1]
+                continue
+            del self.buffer[:size]
+            self._apply(message[1], message[2], message[HEADER_SIZE:-1])
+
+    def _apply(self, kind, sequence, payload):
+        expected = self.sequence is not None and sequence == (self.sequence + 1) & 0xFF
+        self.sequence = sequence
+        if kind == FULL_FRAME:
+            count = int.from_bytes(payload[:2], "little")
+            self.states = unpack_states(payload[2:], count)
+            self.in_sync = True
+        elif kind == DELTA:
+            self.in_sync = self.in_sync and expected
+            if self.in_sync:
+                entries = np.frombuffer(payload, dtype="<u2")
+                self.states = self.states.copy()
+                self.states[entries >> SIGN_BITS] = entries & ((1 << SIGN_BITS) - 1)
+
+
+class SerialSignTransport:
+    """Sends sign messages down a serial line; needs pyserial."""
+
+    def __init__(self, device, baud=SIGN_BAUD):
+        import serial  # Only needed when there is a real sign controller attached
+        self.port = serial.Serial(device, baud)
+
+    def send(self, message):
+        self.port.write(message)
+
+    def close(self):
+        self.port.close()
+
+
+class UdpSignTransport:
+    """Sends each sign message as one UDP datagram."""
+
+    def __init__(self, host, port):
+        self.address = (host, port)
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def send(self, message):
+        self.sock.sendto(message, self.address)
+
+    def close(self):
+        self.sock.close()
+
+
+class LoopbackSignTransport:
+    """Decodes sign messages in-process instead of sending them, for tests, dry runs and benchmarks."""
+
+    def __init__(self):
+        self.decoder = SignageDecoder()
+        self.messages = []
+
+    def send(self, message):
+        self.messages.append(message)
+        self.decoder.feed(message)
+
+    def close(self):
+        pass
+
+
+# Function to pick a transport from "loopback", a serial device or "host:port"
+def sign_transport(target):
+    if target == "loopback":
+        return LoopbackSignTransport()
+    if target.startswith("/dev/") or target.upper().startswith("COM"):
+        return SerialSignTransport(target)
+    host, port = target.rsplit(":", 1)
+    return UdpSignTransport(host, int(port))
+
+# Function to find the directed edge each door sign shows
+def sign_edges(core, doors=None):
+    """Core slot per sign; doors is a list of (from room, to room), None puts a sign on every directed edge."""
+    if doors is None:
+        return np.arange(len(core.indices))
+    rooms_from, rooms_to = zip(*doors)
+    return core.edge_ids(core.ids(rooms_from), core.ids(rooms_to))
+
+
+class SignageOutput:
+    """Drives the door signs from the directed edge states.
+
+    Sign i shows the state of directed edge edges[i]. publish() compares
+    the signs against what was last sent and sends only the changed ones as
+    a delta message, or a full frame when that is shorter, for the first
+    publish and every keyframe_every publishes. At two bytes per changed
+    sign a 9600-baud line carries hundreds of sign changes per tick.
+    """
+
+    def __init__(self, edges, transport, keyframe_every=KEYFRAME_EVERY):
+        self.edges = np.asarray(edges, dtype=np.int64)
+        if len(self.edges) > MAX_SIGNS:
+            raise ValueError(f"{len(self.edges)} signs, at most {MAX_SIGNS} fit the delta format")
+        self.transport = transport
+        self.keyframe_every = keyframe_every
+        self.shown = None  # Sign states as of the last message sent
+        self.sequence = 0
+        self.since_keyframe = 0
+        self.bytes_sent = 0
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def publish(self, edge_states):
+        """Send whatever changed; returns the number of bytes sent."""
+        states = edge_states[self.edges]
+        self.since_keyframe += 1
+        if self.shown is None or self.since_keyframe >= self.keyframe_every:
+            message = encode_full(states, self.sequence)
+            self.since_keyframe = 0
+        else:
+            changed = np.flatnonzero(states != self.shown)
+            if not len(changed):
+                return 0
+            message = encode_delta(changed, states[changed], self.sequence)
+            full = encode_full(states, self.sequence)
+            if len(full) <= len(message):
+                message = full
+                self.since_keyframe = 0
+        self.transport.send(message)
+        self.shown = states
+        self.sequence = (self.sequence + 1) & 0xFF
+        self.bytes_sent += len(message)
+        return len(message)
+
+    def start(self, clock):
+        """Publish the clock's latest snapshot once per tick on a background thread."""
+        def run():
+            tick = None
+            while not self._stopped.wait(clock.simulation.tick_speed / 1000):
+                snapshot = clock.latest
+                if snapshot.tick != tick:
+                    tick = snapshot.tick
+                    self.publish(snapshot.edge_states)
+        self._stopped.clear()
+        self._thread = threading.Thread(target=run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.transport.close()
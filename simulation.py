@@ -0,0 +1,451 @@
+import threading
+import time
+from collections import deque, namedtuple
+
+import numpy as np
+
+from fire import fire_eta_quantiles, spread_fire_step
+from metrics import LAG_BUCKETS, Metrics
+from routing import EdgeStates, find_timed_paths, RouteTree
+
+TICK_SPEED = 500  # Milliseconds of simulated time per tick
+FIRE_SPREAD_SECONDS = 2  # Fire spreads every 2 seconds
+FIRE_ENSEMBLE_SIZE = 0  # Fire futures per ETA update, 0 for the single random-rate estimate (500 takes seconds)
+MAX_CATCH_UP = 10  # Ticks the clock may run back to back before it lets the schedule slip
+
+# Crowd movement, after the SFPE hydraulic model
+WALK_SPEED = 1.2  # m/s on an empty corridor, turns edge weights (seconds) into corridor lengths
+CORRIDOR_WIDTH = 1.5  # m
+ROOM_AREA = 25.0  # m² of floor per room node
+MAX_DENSITY = 3.0  # People per m² a corridor or room takes before nobody else is let in
+DOOR_WIDTH = 0.9  # m
+DOOR_FLOW = 1.3  # People per second per m of door width
+STAIR_WIDTH = 1.1  # m
+STAIR_FLOW = 1.0  # People per second per m of stair width
+# Relative walking speed against people per m²: unhindered up to 0.54, then falling linearly to a standstill
+SPEED_DENSITY = ((0.0, 1.0), (0.54, 1.0), (3.76, 0.0))
+
+# Immutable view of the model after a tick, the only thing renderers and loggers read.
+# edge_states holds a routing state code per directed edge (core CSR slot), changed_edges
+# the slots whose state changed since the previous snapshot, so applying every snapshot's
+# changes in turn rebuilds edge_states however many ticks apart they were taken. Readers
+# that skip snapshots, like those sampling SimulationClock.latest, compare edge_states
+# instead. The person is occupant 0 of the crowd.
+Snapshot = namedtuple("Snapshot", [
+    "tick", "fire", "exit", "blocked", "warning", "distance_to_safety",
+    "edge_states", "changed_edges", "person_node", "person_position",
+    "occupant_nodes", "occupant_positions",
+])
+
+
+# Function to make a read-only copy of an array for lock-free readers
+def frozen(array):
+    array = np.array(array)
+    array.setflags(write=False)
+    return array
+
+
+class FireState:
+    """Fire mask shared by writer threads, the simulation and lock-free readers.
+
+    Writers on any thread stage() ignitions into a pending buffer and never
+    touch the published mask. The simulation calls swap() on its own thread,
+    which folds everything staged into a fresh read-only mask and publishes
+    it as current. Published masks never change, so a reader that grabbed
+    one can keep using it without a lock however long it takes.
+    """
+
+    def __init__(self, fire):
+        self.current = frozen(fire)
+        self.pending = deque()  # Boolean masks or node ids; append/popleft are thread-safe
+
+    def stage(self, ignited):
+        self.pending.append(ignited)
+
+    def swap(self):
+        """Publish everything staged since the last swap; returns True if the fire grew."""
+        staged = [self.pending.popleft() for _ in range(len(self.pending))]
+        if not staged:
+            return False
+        # Sensors stage a mask every tick, mostly of rooms already burning; only new fire costs a copy
+        current = self.current
+        staged = [ignited for ignited in staged if not current[ignited].all()]
+        if not staged:
+            return False
+        fire = current.copy()
+        for ignited in staged:
+            fire[ignited] = True
+        fire.setflags(write=False)
+        self.current = fire  # Swapping the reference is atomic
+        return True
+
+
+# Function to read each node's next hop off its safe path
+def next_hops(core, safe_paths):
+    """(next_hop, hop_edge) per node: the second node of its path and the core slot leading there, -1 if none."""
+    next_hop = np.fromiter((path[1] if path and len(path) > 1 else -1 for path in safe_paths),
+                           dtype=np.int64, count=len(safe_paths))
+    hop_edge = np.full(len(safe_paths), -1, dtype=np.int64)
+    moving = np.flatnonzero(next_hop >= 0)
+    hop_edge[moving] = core.edge_ids(moving, next_hop[moving])
+    return next_hop, hop_edge
+
+# Function to number each element within its group in ticket order, 0 for the front of each queue
+def queue_rank(groups, tickets):
+    order = np.lexsort((tickets, groups))
+    ordered = groups[order]
+    positions = np.arange(len(order))
+    starts = np.flatnonzero(np.r_[True, ordered[1:] != ordered[:-1]])
+    rank = np.empty(len(order), dtype=np.int64)
+    rank[order] = positions - np.repeat(starts, np.diff(np.r_[starts, len(order)]))
+    return rank
+
+
+class Crowd:
+    """Every occupant as one row of NumPy arrays, all advanced together by step().
+
+    From a node an occupant heads for its next hop; the position is
+    interpolated before t advances, and it snaps onto the target node once
+    t reaches 1. Positions are republished as a new read-only array each step.
+
+    Doors and stairs only let DOOR_FLOW or STAIR_FLOW people per m of width
+    through each second, so anyone wanting an edge joins its FIFO queue and
+    is let on in ticket order as the edge's flow credit allows, as long as
+    the corridor and the room behind it have space. Walking speed is one edge per weight seconds
+    scaled by speed_density, a curve of relative speed against people per
+    m² on the corridor (both directions). Occupancy per edge and per node is
+    kept up to date from the occupants that moved, never recounted.
+    """
+
+    def __init__(self, core, start_nodes, tick_speed=TICK_SPEED, speed_density=SPEED_DENSITY):
+        self.coords = core.coords
+        self.destination = core.indices
+        self.tick_speed = tick_speed
+        self.speed_density = tuple(zip(*speed_density))  # (densities, relative speeds) for np.interp
+        self.node = np.array(start_nodes, dtype=np.int64)  # Node each occupant is at or leaving
+        self.target = np.full(len(self.node), -1, dtype=np.int64)  # Node it is heading for, -1 if standing
+        self.edge = np.full(len(self.node), -1, dtype=np.int64)  # Core slot it is walking, -1 if at a node
+        self.queue = np.full(len(self.node), -1, dtype=np.int64)  # Core slot it is queuing for, -1 if none
+        self.ticket = np.zeros(len(self.node), dtype=np.int64)  # Place in that slot's queue, lower goes first
+        self.t = np.zeros(len(self.node))  # Interpolation factor (0 → node, 1 → target)
+        self.speed = np.full(len(self.node), 0.1)  # Share of the edge covered per tick
+        self.position = frozen(self.coords[self.node])
+
+        # Corridors are as long as the free walking speed covers in the edge's weight
+        seconds = self.tick_speed / 1000
+        area = core.weights * WALK_SPEED * CORRIDOR_WIDTH
+        stairs = core.stairwell[core.edge_source] & core.stairwell[core.indices] & (
+            core.coords[core.edge_source, 2] != core.coords[core.indices, 2])
+        reverse = core.reverse_edge_ids()
+        self.reverse = np.where(reverse >= 0, reverse, len(reverse))  # Opposite slot, or the zero pad below
+        self.free_speed = seconds / core.weights  # Share of the edge covered per tick when it is empty
+        self.edge_area = area
+        self.edge_capacity = np.maximum(np.floor(area * MAX_DENSITY), 1)
+        self.flow = np.where(stairs, STAIR_FLOW * STAIR_WIDTH, DOOR_FLOW * DOOR_WIDTH) * seconds  # People per tick
+        self.burst = np.maximum(self.flow, 1)  # Unused credit never builds beyond this, a lone walker always fits
+        self.credit = self.burst.copy()
+        self.joined = np.zeros(len(core.indices), dtype=np.int64)  # Tickets handed out per slot
+        self.served = np.zeros(len(core.indices), dtype=np.int64)  # Tickets below this have had their turn
+        self.node_capacity = np.where(core.exit, np.inf, ROOM_AREA * MAX_DENSITY)
+
+        # Occupancy, kept in step with the arrays above; edge_count has a trailing zero for missing reverse slots
+        self.edge_count = np.zeros(len(reverse) + 1, dtype=np.int64)
+        self.node_count = np.bincount(self.node, minlength=len(core))
+        self.inbound = np.zeros(len(core), dtype=np.int64)  # People walking an edge into each node
+
+    def __len__(self):
+        return len(self.node)
+
+    @property
+    def queued(self):
+        return int((self.queue >= 0).sum())
+
+    def edge_density(self):
+        """People per m² on each directed edge's corridor, counting both directions."""
+        count = self.edge_count[:-1] + self.edge_count[self.reverse]
+        return count / self.edge_area
+
+    def step(self, next_hop, hop_edge):
+        """Advance every occupant one tick towards next_hop (per node, -1 to stay put); hop_edge is its core slot."""
+        # Move smoothly along the current edge, updating the arrays in place
+        walking = self.edge >= 0
+        target = np.where(walking, self.target, self.node)
+        position = np.take(self.coords, self.node, axis=0)
+        offset = np.take(self.coords, target, axis=0)
+        offset -= position
+        offset *= self.t[:, None]
+        position += offset
+        standing = ~walking
+        position[standing] = self.position[standing]
+        self.position = frozen(position)
+        np.add(self.t, self.speed, out=self.t, where=walking)
+
+        # Snap to node, handing the occupant from the edge's count to the node's
+        arrived = np.flatnonzero(self.t >= 1)
+        if len(arrived):
+            self.edge_count[:-1] -= np.bincount(self.edge[arrived], minlength=len(self.destination))
+            self.node[arrived] = target[arrived]
+            moved = np.bincount(self.node[arrived], minlength=len(self.node_count))
+            self.node_count += moved
+            self.inbound -= moved
+            self.t[arrived] = 0
+            self.edge[arrived] = -1
+            self.target[arrived] = -1
+
+        # Anyone on a node queues for the next hop of its path, keeping its ticket if the hop is unchanged
+        at_node = np.flatnonzero(self.edge < 0)
+        want = np.take(hop_edge, self.node[at_node])
+        joining = (want != self.queue[at_node]) & (want >= 0)
+        slot = want[joining]
+        self.ticket[at_node[joining]] = self.joined[slot] + queue_rank(slot, at_node[joining])
+        self.joined += np.bincount(slot, minlength=len(self.joined))
+        self.queue[at_node] = want
+        self.admit(at_node[want >= 0])
+
+        # Speed follows the density of the corridor being walked
+        edge_speed = self.free_speed * np.interp(self.edge_density(), *self.speed_density)
+        np.copyto(self.speed, np.take(edge_speed, self.edge), where=self.edge >= 0)
+
+    def admit(self, waiting):
+        """Let queuing occupants onto their edges in ticket order, as flow credit and space allow.
+
+        Tickets are numbered per slot, so the next allowance tickets after
+        served are up without sorting the queues. Tickets of occupants that
+        left a queue for another one are simply skipped.
+        """
+        self.credit = np.minimum(self.credit, self.burst) + self.flow
+        occupied = self.edge_count[:-1] + self.edge_count[self.reverse]
+        # Counterflow can leave a corridor over capacity, which lets nobody on rather than a negative number
+        allowance = np.maximum(np.minimum(np.floor(self.credit), self.edge_capacity - occupied), 0).astype(np.int64)
+        turn = np.minimum(self.served + allowance, self.joined)
+        slot = self.queue[waiting]
+        ticket = self.ticket[waiting]
+        passing = ticket < turn[slot]
+        waiting, slot, ticket = waiting[passing], slot[passing], ticket[passing]
+        # The rooms behind the doors must have space too, whoever does not fit keeps its place
+        room = self.destination[slot]
+        space = self.node_capacity - self.node_count - self.inbound
+        passing = queue_rank(room, ticket) < space[room]
+        np.minimum.at(turn, slot[~passing], ticket[~passing])
+        self.served = np.maximum(self.served, turn)  # Tickets already let on never come back
+        waiting, slot, room = waiting[passing], slot[passing], room[passing]
+
+        entered = np.bincount(slot, minlength=len(self.destination))
+        self.credit -= entered
+        self.edge_count[:-1] += entered
+        self.inbound += np.bincount(room, minlength=len(self.node_count))
+        self.node_count -= np.bincount(self.node[waiting], minlength=len(self.node_count))
+        self.edge[waiting] = slot
+        self.target[waiting] = room
+        self.queue[waiting] = -1
+
+
+class Simulation:
+    """Fire, routing and evacuee model, advanced one fixed tick at a time by step().
+
+    Knows nothing about wall-clock time or drawing: SimulationClock decides
+    when to step, and renderers only ever see the Snapshot from snapshot().
+    """
+
+    def __init__(self, G, core, start_node, tick_speed=TICK_SPEED, fire_ensemble_size=FIRE_ENSEMBLE_SIZE, sensors=None,
+                 occupants=(), metrics=None):
+        self.G = G
+        self.core = core
+        self.tick_speed = tick_speed
+        self.fire_ensemble_size = fire_ensemble_size
+        self.sensors = sensors  # sensors.SensorFeed, drained once per tick
+        # core.fire is always the latest published, read-only mask from here on
+        self.fire_state = FireState(core.fire)
+        core.fire = self.fire_state.current
+        # The person being followed plus everyone else in the building, by start node id
+        self.crowd = Crowd(core, np.concatenate(([start_node], np.asarray(occupants, dtype=np.int64))), tick_speed)
+
+        # Exit-rooted route tree, repaired in place as the fire spreads
+        self.route_tree = RouteTree(core)
+        self.timed_paths = [None] * len(core)  # Routes that stay ahead of the fire front
+        self.safe_paths = list(self.route_tree.paths)
+        self.next_hop, self.hop_edge = next_hops(core, self.safe_paths)
+        self.tick = 0
+        self.fire_spread_time = 1
+        self.edge_states = EdgeStates(core)
+        self.changed_edges = self.update_edge_states(self.safe_paths)
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.register_metrics()
+
+    # Function to declare the simulation's counters and gauges, gauges are only read when scraped
+    def register_metrics(self):
+        metrics, core, crowd = self.metrics, self.core, self.crowd
+        self.sensor_lag = metrics.histogram(
+            "evac_sensor_lag_seconds", "Time from a sensor reading being taken to it reaching the model", LAG_BUCKETS)
+        metrics.gauge("evac_tick", "Ticks simulated so far", lambda: self.tick)
+        metrics.gauge("evac_tick_budget_seconds", "Simulated time per tick", lambda: self.tick_speed / 1000)
+        metrics.gauge("evac_graph_nodes", "Rooms in the building graph", lambda: len(core))
+        metrics.gauge("evac_graph_edges", "Directed edges in the building graph", lambda: len(core.indices))
+        metrics.gauge("evac_rooms_burning", "Rooms on fire", lambda: int(core.fire.sum()))
+        metrics.gauge("evac_occupants", "Occupants in the crowd", lambda: len(crowd))
+        metrics.gauge("evac_occupants_queued", "Occupants queuing at a door or stair", lambda: crowd.queued)
+        metrics.gauge("evac_occupants_at_exit", "Occupants standing at an exit", lambda: int(core.exit[crowd.node].sum()))
+
+    # Function to publish staged fire and point core.fire at it
+    def swap_fire(self):
+        moved = self.fire_state.swap()
+        self.core.fire = self.fire_state.current
+        return moved
+
+    # Fire spread function
+    def spread_fire(self):
+        self.fire_state.stage(spread_fire_step(self.core, self.core.fire))
+        return self.swap_fire()
+
+    # Function to calculate fire ETA for each node based on the safest path
+    def calculate_fire_eta(self):
+        core = self.core
+        if self.fire_ensemble_size:
+            # Play the fire forward many times and plan against the early (p10) arrival
+            core.fire_eta_p10[:], core.fire_eta_p50[:], core.fire_eta_p90[:] = fire_eta_quantiles(
+                core, core.fire, self.fire_ensemble_size, ticks_per_step=FIRE_SPREAD_SECONDS * (1000 / self.tick_speed))
+            core.fire_eta[:] = core.fire_eta_p10
+        else:
+            # One multi-source Dijkstra from every burning room gives the distance to the nearest fire
+            lengths = core.distances_from(np.flatnonzero(core.fire))
+            # Scale the warning time by tick speed and add randomness
+            fire_spread_rate = np.random.uniform(0.7, 1.5, len(core))  # Random fire spread rate
+            # Keep the raw fire arrival time for the time-dependent router
+            core.fire_eta[:] = (lengths * (1000 / self.tick_speed)) / fire_spread_rate
+
+        # Update warning values to reflect the minimum fire spread value along the safest path,
+        # read off the live route tree instead of rebuilding one
+        self.route_tree.update(core.fire)
+        core.warning[:] = self.route_tree.path_min(core.fire_eta)
+
+    # Function to calculate distance to safety (exit) for each node
+    def calculate_distance_to_safety(self):
+        # One multi-source Dijkstra from every exit, walking edges towards them
+        self.core.distance_to_safety[:] = self.core.distances_from(np.flatnonzero(self.core.exit), reverse=True)
+
+    # Function to bring the directed edge states up to date, returns the edges that changed
+    def update_edge_states(self, safe_paths=None):
+        core = self.core
+        yellow = core.warning < core.distance_to_safety
+        return self.edge_states.update(core.fire, self.route_tree.blocked, yellow, safe_paths)
+
+    def step(self):
+        """Advance the model by exactly one tick of tick_speed milliseconds."""
+        with self.metrics.stage("tick"):
+            self._step()
+
+    def _step(self):
+        core = self.core
+        stage = self.metrics.stage
+        if self.sensors is not None:
+            # Everything the sensors reported since the last tick lands as one update
+            with stage("sensors"):
+                self.fire_state.stage(self.sensors.drain_fire_mask())
+            self.sensor_lag.observe_many(self.sensors.lag)
+        with stage("fire_spread"):
+            fire_moved = self.swap_fire()  # Ignitions staged by any thread since the last tick
+            if self.fire_spread_time >= FIRE_SPREAD_SECONDS * (1000 / self.tick_speed):
+                fire_moved = self.spread_fire() or fire_moved
+                self.fire_spread_time = 0
+            self.fire_spread_time += 1
+        if fire_moved:
+            with stage("fire_eta"):
+                self.calculate_fire_eta()  # Update fire ETA for all nodes
+            with stage("distance_to_safety"):
+                self.calculate_distance_to_safety()  # Update distance to safety for all nodes
+
+        with stage("route_tree"):
+            changed_nodes = self.route_tree.update(core.fire)  # Only reroutes nodes cut off by new fire
+        if len(changed_nodes) or fire_moved:  # Fire front moved, re-plan against its ETA
+            with stage("timed_paths"):
+                self.timed_paths, _ = find_timed_paths(core, core.fire, core.fire_eta, self.tick_speed, self.route_tree)
+                # Prefer routes that outrun the fire, fall back to the shortest one
+                self.safe_paths = [timed or path for timed, path in zip(self.timed_paths, self.route_tree.paths)]
+                self.next_hop, self.hop_edge = next_hops(core, self.safe_paths)
+            with stage("edge_states"):
+                changed = self.update_edge_states(self.safe_paths)
+        else:
+            with stage("edge_states"):
+                changed = self.update_edge_states()
+        if len(changed):
+            # Held until the next snapshot, so ticks nobody took a snapshot of are not lost
+            self.changed_edges = np.union1d(self.changed_edges, changed)
+
+        # Move everyone gradually
+        with stage("crowd"):
+            self.crowd.step(self.next_hop, self.hop_edge)
+        self.tick += 1
+
+    def snapshot(self):
+        """Copy out the state a renderer needs; the arrays are read-only. Starts changed_edges over."""
+        core = self.core
+        changed, self.changed_edges = self.changed_edges, np.zeros(0, dtype=np.int64)
+        arrays = [core.exit, self.route_tree.blocked, core.warning, core.distance_to_safety]
+        # The published fire mask, edge states and crowd positions are already read-only, no copy needed
+        crowd = self.crowd
+        return Snapshot(self.tick, core.fire, *map(frozen, arrays), self.edge_states.state,
+                        frozen(changed), int(crowd.node[0]), tuple(crowd.position[0]),
+                        frozen(crowd.node), crowd.position)
+
+
+class SimulationClock:
+    """Steps a Simulation on its own thread at a fixed timestep and keeps the latest Snapshot.
+
+    speed is simulated seconds per wall-clock second, None runs as fast as
+    the model allows. Slow readers never slow the model down, they just
+    sample fewer snapshots.
+    """
+
+    def __init__(self, simulation, speed=1.0):
+        self.simulation = simulation
+        self.speed = speed
+        self.latest = simulation.snapshot()
+        self.paused = False
+        metrics = simulation.metrics
+        metrics.counter("evac_tick_overruns_total", "Ticks whose step took longer than their wall-clock slot")
+        metrics.counter("evac_schedule_slips_total", "Times the clock fell too far behind and dropped ticks")
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self.run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def run(self):
+        dt = self.simulation.tick_speed / 1000
+        next_tick = time.perf_counter()
+        while not self._stopped.is_set():
+            if self.paused:
+                self._stopped.wait(dt)
+                next_tick = time.perf_counter()
+                continue
+            started = time.perf_counter()
+            self.simulation.step()
+            with self.simulation.metrics.stage("snapshot"):
+                self.latest = self.simulation.snapshot()  # Swapping the reference is atomic
+
+            if self.speed is None:
+                continue
+            now = time.perf_counter()
+            if now - started > dt / self.speed:
+                self.simulation.metrics.count("evac_tick_overruns_total")
+            next_tick += dt / self.speed
+            lag = now - next_tick
+            if lag < 0:
+                self._stopped.wait(-lag)
+            elif lag > MAX_CATCH_UP * dt / self.speed:
+                next_tick = time.perf_counter()  # Too far behind to catch up, let the schedule slip
+                self.simulation.metrics.count("evac_schedule_slips_total")
+
+    def run_for(self, ticks):
+        """Step synchronously on the calling thread, as fast as possible."""
+        for _ in range(ticks):
+            self.simulation.step()
+        self.latest = self.simulation.snapshot()
+        return self.latest
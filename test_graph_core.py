@@ -0,0 +1,58 @@
+import networkx as nx
+import numpy as np
+import pytest
+
+from building import grid_building
+from graph_core import BuildingGraph
+
+
+# Function to turn a grid building into a DiGraph where some corridors only go one way
+def one_way_building(seed):
+    rng = np.random.default_rng(seed)
+    G = nx.DiGraph()
+    building = grid_building(3, 4, 5)
+    G.add_nodes_from(building.nodes(data=True))
+    for u, v, data in building.edges(data=True):
+        roll = rng.random()
+        if roll < 0.8:
+            G.add_edge(u, v, **data)
+        if roll > 0.2:
+            G.add_edge(v, u, **data)
+    return G
+
+
+def test_reverse_edge_ids_on_every_slot():
+    for seed in range(20):
+        G = one_way_building(seed)
+        core = BuildingGraph.from_networkx(G)
+        reverse = core.reverse_edge_ids()
+        for slot, back in enumerate(reverse.tolist()):
+            u, v = core.names[core.edge_source[slot]], core.names[core.indices[slot]]
+            if G.has_edge(v, u):
+                assert (core.edge_source[back], core.indices[back]) == (core.indices[slot], core.edge_source[slot])
+            else:
+                assert back == -1
+
+
+def test_reverse_edge_ids_on_a_slot_subset():
+    for seed in range(20):
+        core = BuildingGraph.from_networkx(one_way_building(seed))
+        everything = core.reverse_edge_ids()
+        slots = np.random.default_rng(seed).choice(len(core.indices), 7, replace=False)
+        np.testing.assert_array_equal(core.reverse_edge_ids(slots), everything[slots])
+
+
+def test_edge_ids_finds_every_slot():
+    core = BuildingGraph.from_networkx(one_way_building(0))
+    slots = np.arange(len(core.indices))
+    np.testing.assert_array_equal(core.edge_ids(core.edge_source, core.indices), slots)
+
+
+def test_edge_ids_rejects_pairs_that_are_not_edges():
+    G = one_way_building(0)
+    core = BuildingGraph.from_networkx(G)
+    u, v = next((u, v) for u, v in G.edges if not G.has_edge(v, u))
+    with pytest.raises(KeyError, match=f"{v} -> {u}"):
+        core.edge_ids(core.ids([u, v]), core.ids([v, u]))
+    with pytest.raises(KeyError):
+        core.edge_ids(core.ids(["R0_0_0"]), core.ids(["R2_2_3"]))
@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+
+from building import grid_building
+from graph_core import BuildingGraph
+from signage import DELTA, FULL_FRAME, LoopbackSignTransport, SignageOutput, sign_edges
+from simulation import Simulation
+
+
+def test_sign_edges_follow_the_doors_given():
+    core = BuildingGraph.from_networkx(grid_building())
+    doors = [("R0_0_1", "R0_0_0"), ("R0_0_0", "R0_0_1"), ("R2_1_1", "R2_1_2")]
+    edges = sign_edges(core, doors)
+    assert [(core.names[core.edge_source[k]], core.names[core.indices[k]]) for k in edges] == doors
+    np.testing.assert_array_equal(sign_edges(core), np.arange(len(core.indices)))
+
+
+def test_sign_edges_reject_a_door_that_is_not_an_edge():
+    core = BuildingGraph.from_networkx(grid_building())
+    with pytest.raises(KeyError, match="R0_0_0 -> R2_2_3"):
+        sign_edges(core, [("R0_0_1", "R0_0_0"), ("R0_0_0", "R2_2_3")])
+
+
+def test_loopback_decodes_what_was_published():
+    G = grid_building()
+    core = BuildingGraph.from_networkx(G)
+    simulation = Simulation(G, core, core.index["R2_0_0"])
+    signs = SignageOutput(sign_edges(core), LoopbackSignTransport(), keyframe_every=5)
+    decoder = signs.transport.decoder
+    kinds = set()
+    for _ in range(60):
+        simulation.step()
+        states = simulation.snapshot().edge_states
+        if signs.publish(states):
+            kinds.add(signs.transport.messages[-1][1])
+        assert decoder.in_sync
+        np.testing.assert_array_equal(decoder.states, states[signs.edges])
+    assert kinds == {FULL_FRAME, DELTA}